@@ -1,18 +1,21 @@
 import streamlit as st
 import streamlit.components.v1 as components
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN
-from pptx.dml.color import RGBColor
-from pptx.enum.shapes import MSO_SHAPE, MSO_SHAPE_TYPE 
-from io import BytesIO
-import docx
-from docx.document import Document
-from docx.text.paragraph import Paragraph
-from docx.table import Table
-import fitz  # PyMuPDF
-import re
+import hashlib
+import json
+import os
 import pandas as pd
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from figure_cache import DEFAULT_MAX_BYTES, FigureCache
+from instrumentation import Stopwatch, summarize_run
+from jobs import CANCELLED, DONE, FAILED, JobRegistry
+from pdf_figures import DEFAULT_RENDER_SETTINGS, MAX_FIGURES, THUMBNAIL_PX, clip_render_settings
+from pdf_matching import normalize_pdf_key
+from pdf_store import PdfStore
+from pipeline import (
+    IncrementalIntegrator, apply_figures, extract_figures, figure_jobs, match_cases, parse_word_files, sort_results,
+)
+from ppt_builder import build_deck_bytes, build_deck_zip, claim_groups_for_case, shard_cases
 
 # --- 設定網頁標題 ---
 st.set_page_config(page_title="PPT 重組生成器 ", page_icon="📑", layout="wide")
@@ -66,214 +69,248 @@ if 'slides_data' not in st.session_state:
 if 'status_report' not in st.session_state:
     st.session_state['status_report'] = []
 
-# --- 輔助函數：遍歷 Word ---
-def iter_block_items(parent):
-    if isinstance(parent, Document):
-        parent_elm = parent.element.body
-    else:
-        raise ValueError("只支援讀取整份 Document")
-    for child in parent_elm.iterchildren():
-        if child.tag.endswith('p'):
-            yield Paragraph(child, parent)
-        elif child.tag.endswith('tbl'):
-            yield Table(child, parent)
-
-# --- 函數：搜尋 PDF 截圖 ---
-def extract_specific_figure_from_pdf(pdf_stream, target_fig_text):
-    if not target_fig_text:
-        return None, "Word 中未指定代表圖文字"
-    try:
-        doc = fitz.open(stream=pdf_stream, filetype="pdf")
-        pattern = re.compile(r'((?:FIG\.?|Figure|圖)\s*[0-9]+[A-Za-z]*)', re.IGNORECASE)
-        search_keywords = []
-        lines = target_fig_text.split('\n')
-        for line in lines:
-            match = pattern.search(line)
-            if match:
-                clean_keyword = match.group(1).replace(" ", "").upper()
-                search_keywords.append(clean_keyword)
-        
-        if not search_keywords:
-             first_line = lines[0].strip()
-             if first_line:
-                 search_keywords.append(first_line[:10].replace(" ", "").upper())
-
-        target_keyword = search_keywords[0] if search_keywords else ""
-        if not target_keyword:
-            return None, "無法從說明文字中識別出圖號"
-
-        found_page_index = None
-        matched_keyword_log = ""
-        for i, page in enumerate(doc):
-            page_text = page.get_text().replace(" ", "").upper()
-            if target_keyword in page_text:
-                found_page_index = i
-                matched_keyword_log = target_keyword
-                break
-        
-        if found_page_index is not None:
-            page = doc[found_page_index]
-            mat = fitz.Matrix(2, 2)
-            pix = page.get_pixmap(matrix=mat)
-            return pix.tobytes("png"), f"成功"
-        return None, f"PDF 中找不到關鍵字「{target_keyword}」"
-    except Exception as e:
-        return None, f"PDF 解析發生錯誤: {str(e)}"
-
-# --- 函數：提取專利號 ---
-def extract_patent_number_from_text(text):
-    clean_text = text.replace("：", ":").replace(" ", "")
-    match = re.search(r'([a-zA-Z]{2,4}\d+[a-zA-Z]?)', clean_text)
-    if match: return match.group(1)
-    return ""
-
-# --- 函數：提取日期 (排序用) ---
-def extract_date_for_sort(text):
-    match = re.search(r'(\d{4})[./-](\d{1,2})[./-](\d{1,2})', text)
-    if match: return f"{match.group(1)}{match.group(2).zfill(2)}{match.group(3).zfill(2)}"
-    return "99999999"
-
-# --- 函數：提取公司 (排序用) ---
-def extract_company_for_sort(text):
-    lines = text.split('\n')
-    for line in lines:
-        if "公司" in line or "申請人" in line:
-            if "案號" in line and "日期" in line: continue
-            return line.replace("公司", "").replace("申請人", "").replace("：", "").replace(":", "").strip()
-    return "ZZZ"
-
-# --- 函數：解析 Word 檔案 ---
-def parse_word_file(uploaded_docx):
-    try:
-        doc = docx.Document(uploaded_docx)
-        cases = []
-        current_case = {
-            "case_info": "", "problem": "", "spirit": "", "key_point": "", "rep_fig_text": "", "claim_text": "",
-            "image_data": None, "image_name": "Word匯入", "raw_case_no": "",
-            "sort_date": "99999999", "sort_company": "ZZZ",
-            "source_file": uploaded_docx.name, "missing_fields": []
-        }
-        current_field = None 
-        
-        all_lines = []
-        for block in iter_block_items(doc):
-            if isinstance(block, Paragraph):
-                if block.text.strip(): all_lines.append(block.text.strip())
-            elif isinstance(block, Table):
-                for row in block.rows:
-                    for cell in row.cells:
-                        for p in cell.paragraphs:
-                            if p.text.strip(): all_lines.append(p.text.strip())
-        
-        for text in all_lines:
-            if "案號" in text or "索號" in text:
-                if current_case["case_info"] and current_field != "case_info_block":
-                    if not current_case["problem"]: current_case["missing_fields"].append("解決問題")
-                    cases.append(current_case)
-                    current_case = {
-                        "case_info": "", "problem": "", "spirit": "", "key_point": "", "rep_fig_text": "", "claim_text": "",
-                        "image_data": None, "image_name": "Word匯入", "raw_case_no": "",
-                        "sort_date": "99999999", "sort_company": "ZZZ",
-                        "source_file": uploaded_docx.name, "missing_fields": []
-                    }
-                current_field = "case_info_block"
-                current_case["case_info"] = text
-                extracted_no = extract_patent_number_from_text(text)
-                if extracted_no: current_case["raw_case_no"] = extracted_no
-                current_case["sort_date"] = extract_date_for_sort(text)
-                current_case["sort_company"] = extract_company_for_sort(text)
-                continue
-
-            if "解決問題" in text:
-                current_field = "problem"
-                current_case["problem"] = re.sub(r'^[0-9.．]*\s*解決問題[:：]?\s*', '', text)
-                continue
-            elif "發明精神" in text:
-                current_field = "spirit"
-                current_case["spirit"] = re.sub(r'^[0-9.．]*\s*發明精神[:：]?\s*', '', text)
-                continue
-            elif "重點" in text:
-                current_field = "key_point"
-                current_case["key_point"] = re.sub(r'^[0-9.．]*\s*(一句)?重點[:：]?\s*', '', text)
-                continue
-            elif "代表圖" in text:
-                current_field = "rep_fig"
-                current_case["rep_fig_text"] = re.sub(r'^[0-9.．]*\s*代表圖[:：]?\s*', '', text).strip()
-                continue
-            elif "獨立項" in text or ("claim" in text.lower() and "6" in text):
-                current_field = "claim"
-                content = re.sub(r'^[0-9.．]*\s*(獨立項)?(claim)?[:：]?\s*', '', text, flags=re.IGNORECASE).strip()
-                current_case["claim_text"] = content
-                continue
-
-            if current_field == "case_info_block":
-                current_case["case_info"] += "\n" + text
-                if current_case["sort_date"] == "99999999": current_case["sort_date"] = extract_date_for_sort(text)
-                extracted_comp = extract_company_for_sort(current_case["case_info"])
-                if extracted_comp != "ZZZ": current_case["sort_company"] = extracted_comp
-                if not current_case["raw_case_no"]:
-                    extracted_no = extract_patent_number_from_text(text)
-                    if extracted_no: current_case["raw_case_no"] = extracted_no
-            elif current_field == "rep_fig":
-                current_case["rep_fig_text"] += "\n" + text
-            elif current_field == "problem":
-                current_case["problem"] += "\n" + text
-            elif current_field == "spirit":
-                current_case["spirit"] += "\n" + text
-            elif current_field == "key_point":
-                current_case["key_point"] += "\n" + text
-            elif current_field == "claim": 
-                current_case["claim_text"] += "\n" + text
-
-        if current_case["case_info"]:
-            if not current_case["problem"]: current_case["missing_fields"].append("解決問題")
-            cases.append(current_case)
-        return cases
-    except Exception as e:
-        st.error(f"解析 Word 錯誤 ({uploaded_docx.name}): {e}")
-        return []
-
-# --- 輔助函數：分割 Claim (嚴格修正版) ---
-def split_claims_text(full_text):
-    """
-    分割依據：
-    1. "(Claim 數字)" -> 這是您的 Word 中標題的特徵 (例如 '• ... (Claim 1)')
-    2. 行首 "Claim 數字"
-    3. 行首 "獨立項 數字"
-    4. 行首 "數字. " (排除內文中可能出現的數字)
-    """
-    if not full_text: return []
-    
-    lines = full_text.split('\n')
-    claims = []
-    current_chunk = []
-    
-    # 關鍵修正：
-    # 1. \(Claim\s*\d+\) -> 抓取夾在中間的 (Claim 1)
-    # 2. ^\s*(Claim|獨立項)\s*\d+ -> 抓取行首的 Claim 1
-    # 3. ^\s*\d+\.\s -> 抓取行首的 1. (注意後面的空格，避免抓到 1.5mm)
-    header_pattern = re.compile(r'(\(Claim\s*\d+\)|^\s*(Claim|獨立項)\s*\d+|^\s*\d+\.\s)', re.IGNORECASE)
-    
-    for line in lines:
-        # 如果這一行符合標題特徵
-        if header_pattern.search(line):
-            if current_chunk:
-                claims.append(current_chunk)
-            current_chunk = [line]
+if 'run_key' not in st.session_state:
+    st.session_state['run_key'] = ""
+if 'run_metrics' not in st.session_state:
+    st.session_state['run_metrics'] = None
+if 'integrator' not in st.session_state:
+    st.session_state['integrator'] = IncrementalIntegrator()
+if 'pdf_store' not in st.session_state:
+    st.session_state['pdf_store'] = PdfStore()
+# 瀏覽器重新整理會開新的 session：從網址參數接回背景工作
+for job_key in ('integration_job', 'deck_job'):
+    if job_key not in st.session_state:
+        st.session_state[job_key] = st.query_params.get(job_key)
+if 'integration_summary' not in st.session_state:
+    st.session_state['integration_summary'] = None
+if 'deck' not in st.session_state:
+    st.session_state['deck'] = None
+
+
+# --- 背景工作 ---
+# 整合與產生簡報在背景執行緒中執行 (見 jobs.py)，畫面重跑不會中斷也不會重做；
+# 工作 ID 同時記在網址參數，瀏覽器重新整理後接回進行中或剛完成的工作。背景執行緒中不呼叫任何 st.* 函數。
+# 工作屬於提交它的 session：其他 session 只有在原 session 已斷線 (重新整理、關閉分頁) 後才能接手；
+# 結果搬進 session 後立即從登記表取走。上傳檔在工作中比對完才寫入暫存檔 (只寫比對到案件的 PDF)，
+# 寫完即放掉上傳檔；暫存資料夾 (PdfStore) 也放在工作參數裡，原 session 被回收時不會被刪掉。
+PROGRESS_INTERVAL = 1.0
+# 預覽每頁筆數選項 (三欄排列)
+PREVIEW_PAGE_SIZES = (12, 24, 48, 96)
+
+
+@st.cache_resource
+def job_registry():
+    return JobRegistry(owner_alive=session_alive)
+
+
+def file_fingerprint(uploaded_file):
+    return hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+
+
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else ""
+
+
+def session_alive(session_id):
+    return not Runtime.exists() or Runtime.instance().is_active_session(session_id)
+
+
+def run_integration(job, p):
+    """背景工作：解析 → 比對 → 擷取代表圖；每個案件完成就放進 job.partial 供預覽"""
+    stage_timings = {}
+    word_files = p["word_files"]
+    word_count = len(word_files)
+    integrator = p["integrator"]
+    job.set_stage("解析 Word", word_count)
+    with Stopwatch(stage_timings, "解析"):
+        word_fingerprints = tuple(file_fingerprint(wf) for wf in word_files)
+        parse_timings = {}
+        if p["incremental"]:
+            all_cases, parse_errors, parsed_count = integrator.parse(word_files, word_fingerprints, p["workers"], parse_timings)
         else:
-            current_chunk.append(line)
-            
-    if current_chunk:
-        claims.append(current_chunk)
-    
-    # 過濾空資料
-    valid_claims = []
-    for chunk in claims:
-        chunk_str = "".join(chunk).strip()
-        if len(chunk_str) > 2:
-            valid_claims.append(chunk)
-            
-    return valid_claims
+            all_cases, parse_errors = parse_word_files(word_files, p["workers"], parse_timings)
+            parsed_count = word_count
+    job.advance(word_count)
+
+    # 比對只需要檔名；只有比對到案件的 PDF 才寫入暫存檔，之後以路徑開啟
+    pdf_uploads = {}
+    for pf in p["pdf_files"]:
+        pdf_uploads[normalize_pdf_key(pf.name)] = pf
+    with Stopwatch(stage_timings, "比對"):
+        matches = match_cases(all_cases, tuple(pdf_uploads))
+    jobs = figure_jobs(all_cases, matches)
+
+    pdf_store = p["pdf_store"]
+    pdf_store.retain(p["pdf_files"])
+    pdf_file_map = {}
+    pdf_fingerprints = {}
+    matched_pdfs = list(dict.fromkeys(pk for pk, _ in jobs))
+    job.set_stage("暫存 PDF", len(matched_pdfs))
+    with Stopwatch(stage_timings, "暫存"):
+        for pk in matched_pdfs:
+            pdf_file_map[pk], pdf_fingerprints[pk] = pdf_store.add(pdf_uploads[pk], check=job.check_cancelled)
+            job.advance()
+    # 之後只用暫存檔與解析結果，上傳檔不再留在工作參數裡
+    p["word_files"] = p["pdf_files"] = word_files = None
+    pdf_uploads.clear()
+
+    # 不需擷取的案件馬上可以預覽；其餘每擷取完一份 PDF 就把該 PDF 的案件放進預覽
+    job_cases = [i for i, (pk, _, _) in enumerate(matches) if pk]
+    job.set_stage("擷取代表圖", len(all_cases))
+    job.advance(len(all_cases) - len(jobs), [case for case, (pk, _, _) in zip(all_cases, matches) if not pk])
+
+    def stream(done):
+        job.advance(len(done), [
+            dict(all_cases[job_cases[pos]], image_data=img_data, thumbnail=info.get("thumbnail"),
+                 figures=info.get("figures") or ([img_data] if img_data else []))
+            for pos, (img_data, _, info) in done
+        ])
+
+    settings = p["settings"]
+    with Stopwatch(stage_timings, "擷取"):
+        if p["incremental"]:
+            extracted, extracted_count = integrator.extract(
+                jobs, pdf_file_map, pdf_fingerprints, p["workers"], p["cache"], settings, p["instrument"], progress=stream
+            )
+        else:
+            extracted = extract_figures(
+                jobs, pdf_file_map, p["workers"], p["cache"], settings, p["instrument"], pdf_fingerprints, progress=stream
+            )
+            extracted_count = len(jobs)
+    status_report_list, match_count = apply_figures(all_cases, matches, extracted, parse_timings if p["instrument"] else None)
+    status_report_list = parse_errors + status_report_list
+    cases_key = (word_fingerprints, tuple(case["raw_case_no"] for case in all_cases))
+    jobs_key = tuple((pdf_fingerprints[pk], fig) for pk, fig in jobs)
+    run_key = hashlib.sha1(repr((cases_key, jobs_key, json.dumps(settings, sort_keys=True))).encode("utf-8")).hexdigest()
+    sort_results(all_cases, status_report_list)
+    return {
+        "all_cases": all_cases, "status_report": status_report_list, "run_key": run_key,
+        "parse_errors": len(parse_errors), "stage_timings": stage_timings,
+        "parsed_count": parsed_count, "extracted_count": extracted_count, "job_count": len(jobs),
+        "word_count": word_count, "incremental": p["incremental"], "instrument": p["instrument"],
+        "use_cache": p["cache"] is not None,
+    }
+
+
+def run_deck(job, p):
+    """背景工作：產生簡報；回傳 {"request", "bytes": 簡報或 zip, "timings": 各步驟時間}。output_options: (輸出方式, 每檔頁數上限, 每檔大小上限 MB)"""
+    slides_data, need_claim_slide, claim_groups = p["slides_data"], p["need_claim_slide"], p["claim_groups"]
+    mode, max_slides, max_mb = p["output_options"]
+    job.set_stage("產生簡報", len(slides_data))
+    timings = {}
+    if mode == "單一檔案":
+        deck_bytes = build_deck_bytes(slides_data, need_claim_slide, claim_groups, timings, progress=job.advance)
+        return {"request": p["request"], "bytes": deck_bytes, "timings": timings}
+    shards = shard_cases(
+        slides_data, need_claim_slide, claim_groups,
+        by_company=(mode == "依申請人分檔"), max_slides=max_slides, max_bytes=max_mb * 1024 * 1024 if max_mb else None
+    )
+    deck_bytes = build_deck_zip(slides_data, need_claim_slide, claim_groups, shards, p["workers"], timings, progress=job.advance)
+    return {"request": p["request"], "bytes": deck_bytes, "timings": timings}
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def claim_split_stage(run_key, _slides_data):
+    return [claim_groups_for_case(data) for data in _slides_data]
+
+
+# --- 函數：預覽卡片 ---
+# 卡片只顯示擷取時產生的小縮圖；原圖只有在打開該卡片的「原圖」開關時才送到瀏覽器
+def render_case_card(i, data, claim_count=None, full_key=None):
+    with st.container(border=True):
+        st.markdown(f"**Case {i+1}**")
+        st.caption(f"{data['sort_company']} | {data['sort_date']}")
+        st.text(data['case_info'][:80] + "...")
+        if data['image_data']:
+            st.image(data.get('thumbnail') or data['image_data'], width=THUMBNAIL_PX)
+            if full_key is not None and st.toggle("🔍 原圖", key=full_key):
+                for img_data in data.get('figures') or [data['image_data']]:
+                    st.image(img_data)
+        else: st.warning("無圖片")
+
+        if claim_count is not None:
+            st.caption(f"Claim: {claim_count} 組 (預計 {claim_count} 頁)")
+
+
+# --- 函數：工作進度 (定時只重跑這一塊；工作結束後整頁重跑以顯示結果) ---
+@st.fragment(run_every=PROGRESS_INTERVAL)
+def job_progress(job_id, title, show_partial=False):
+    job = registry.get(job_id)
+    if job is None or not job.running:
+        st.rerun()
+    snap = job.snapshot()
+    fraction = snap["done"] / snap["total"] if snap["total"] else 0.0
+    st.progress(min(fraction, 1.0), text=f"{title}｜{snap['stage']} {snap['done']} / {snap['total']}（{snap['elapsed']:.0f} 秒）")
+    if job.cancelled:
+        st.caption("取消中，等待目前的步驟結束...")
+    elif st.button("⏹️ 取消", key=f"cancel-{job_id}"):
+        job.cancel()
+    if show_partial and snap["partial"]:
+        # 每秒重畫一次，只顯示最近完成的一頁
+        recent = snap["partial"][-PREVIEW_PAGE_SIZES[0]:]
+        offset = len(snap["partial"]) - len(recent)
+        if offset:
+            st.caption(f"已完成 {len(snap['partial'])} 筆，顯示最近 {len(recent)} 筆")
+        cols = st.columns(3)
+        for i, data in enumerate(recent):
+            with cols[i % 3]:
+                render_case_card(offset + i, data)
+
+
+registry = job_registry()
+
+# --- 接收已結束的背景工作：結果搬進 session 後即從登記表取走 ---
+def claim_job(job_key):
+    """回傳這個 session 可以使用的工作 (進行中或剛結束)；不存在或屬於其他 session 時清掉記錄"""
+    job = registry.claim(st.session_state[job_key], current_session_id(), session_alive)
+    if job is None and st.session_state[job_key]:
+        st.session_state[job_key] = None
+        if job_key in st.query_params:
+            del st.query_params[job_key]
+    return job
+
+
+def finish_job(job_key, job):
+    """取走已結束工作的結果；回傳 (狀態, 結果, 錯誤訊息第一行)"""
+    result = registry.release(job.id)
+    st.session_state[job_key] = None
+    if job_key in st.query_params:
+        del st.query_params[job_key]
+    return job.status, result, job.error.splitlines()[0] if job.error else ""
+
+
+integration_job = claim_job('integration_job')
+if integration_job is not None and not integration_job.running:
+    status, result, error = finish_job('integration_job', integration_job)
+    integration_job = None
+    if status == DONE:
+        if result['parse_errors']:
+            st.session_state['status_report'] = result['status_report']
+        if result['all_cases']:
+            st.session_state['slides_data'] = result['all_cases']
+            st.session_state['status_report'] = result['status_report']
+            st.session_state['run_key'] = result['run_key']
+            st.session_state['run_metrics'] = {"階段時間(ms)": dict(result['stage_timings'])} if result['instrument'] else None
+        # 側邊欄訊息只需要計數，不留案件資料
+        result = {
+            "case_count": len(result['all_cases']), "parse_errors": result['parse_errors'],
+            "parsed_count": result['parsed_count'], "word_count": result['word_count'],
+            "extracted_count": result['extracted_count'], "job_count": result['job_count'],
+            "incremental": result['incremental'], "use_cache": result['use_cache'],
+            "hits": sum(1 for row in result['status_report'] if row["快取"] == "命中"),
+            "misses": sum(1 for row in result['status_report'] if row["快取"] == "未命中"),
+        }
+    st.session_state['integration_summary'] = {"status": status, "result": result, "error": error}
+integration_running = integration_job is not None
+
+deck_job = claim_job('deck_job')
+if deck_job is not None and not deck_job.running:
+    status, result, error = finish_job('deck_job', deck_job)
+    deck_job = None
+    st.session_state['deck'] = {"status": status, "error": error, **(result or {})}
+    if status == DONE and st.session_state['run_metrics'] is not None:
+        st.session_state['run_metrics']["階段時間(ms)"].update(result['timings'])
 
 # --- 側邊欄 ---
 with st.sidebar:
@@ -284,191 +321,141 @@ with st.sidebar:
     st.divider()
     st.header("2. 輸出設定")
     add_claim_slide = st.checkbox("✅ 是否產生 Claim 分頁", value=False, help="勾選後，程式會自動識別獨立項數量，並為每一組獨立項產生一頁")
-
-    if word_files and st.button("🔄 開始智能整合", type="primary"):
-        all_cases = []
-        status_report_list = []
-        
-        for wf in word_files:
-            all_cases.extend(parse_word_file(wf))
-        
-        pdf_file_map = {}
-        if pdf_files:
-            for pf in pdf_files:
-                clean = re.sub(r'[^a-zA-Z0-9]', '', pf.name.rsplit('.', 1)[0])
-                pdf_file_map[clean] = pf.read()
-
-        match_count = 0
-        with st.spinner("處理中..."):
-            for case in all_cases:
-                case_key = case["raw_case_no"]
-                target_fig = case["rep_fig_text"]
-                status = {
-                    "來源": case["source_file"], "案號": case_key if case_key else "?",
-                    "公司": case["sort_company"], "日期": case["sort_date"],
-                    "狀態": "未處理", "原因": "", "缺漏": ", ".join(case["missing_fields"])
-                }
-                
-                matched_pdf = None
-                for pk, pb in pdf_file_map.items():
-                    if case_key and ((pk.lower() in case_key.lower()) or (case_key.lower() in pk.lower())):
-                        if len(case_key) > 4: matched_pdf = pb; break
-                
-                if matched_pdf:
-                    img_data, msg = extract_specific_figure_from_pdf(matched_pdf, target_fig)
-                    if img_data:
-                        case["image_data"] = img_data
-                        status["狀態"] = "✅ 成功"; match_count += 1
-                    else:
-                        status["狀態"] = "⚠️ 缺圖"; status["原因"] = msg
-                else:
-                    if not target_fig: status["狀態"] = "⚠️ 缺資訊"; status["原因"] = "Word無代表圖"
-                    else: status["狀態"] = "❌ 無PDF"; status["原因"] = f"找不到PDF: {case_key}"
-                status_report_list.append(status)
-
-        all_cases.sort(key=lambda x: (x["sort_company"].upper(), x["sort_date"]))
-        status_report_list.sort(key=lambda x: (x["公司"].upper(), x["日期"]))
-
-        if all_cases:
-            st.session_state['slides_data'] = all_cases
-            st.session_state['status_report'] = status_report_list
-            st.success(f"完成！共 {len(all_cases)} 筆資料。")
+    output_mode = st.radio("📦 輸出方式", ["單一檔案", "依申請人分檔", "依頁數上限分檔"], help="分檔時每份簡報在獨立程序中產生，打包成 zip 下載")
+    if output_mode == "依頁數上限分檔":
+        max_slides = st.number_input("每檔頁數上限", min_value=10, value=150, step=10)
+        max_mb = st.number_input("每檔大小上限 (MB，0 = 不限)", min_value=0, value=100, step=10)
+        output_options = (output_mode, int(max_slides), int(max_mb))
+    else:
+        output_options = (output_mode, None, None)
+    workers = st.number_input("⚙️ 平行處理程序數", min_value=1, max_value=os.cpu_count() or 1, value=1, help="大於 1 時，Word 解析與 PDF 搜尋、截圖會分散到多個程序同時處理")
+    render_mode = st.radio("🖼️ 代表圖擷取方式", ["裁切圖區", "整頁"], horizontal=True, help="裁切圖區：只渲染圖所在範圍，解析度依投影片圖框計算，檔案小很多；整頁：整頁 2 倍 PNG")
+    if render_mode == "裁切圖區":
+        image_format = st.selectbox("圖片格式", ["PNG (無損)", "JPEG (壓縮)"])
+        render_settings = clip_render_settings(fmt="jpeg" if image_format.startswith("JPEG") else "png")
+    else:
+        render_settings = DEFAULT_RENDER_SETTINGS
+    if st.checkbox("🎞️ 擷取多張代表圖", value=False, help=f"代表圖說明列出多個圖號時 (提示詞建議 3 張)，一次找出最多 {MAX_FIGURES} 張並排放在投影片上；每頁只渲染一次"):
+        render_settings = dict(render_settings, max_figures=MAX_FIGURES)
+    use_figure_cache = st.checkbox("💾 使用圖片快取", value=True, help="同一份 PDF 的同一頁渲染過一次後存在磁碟上，下次直接讀取")
+    incremental = st.checkbox("⚡ 增量整合", value=True, help="增減檔案後再按整合時，只解析新的 Word、只重新比對與擷取受影響的案件")
+    instrument = st.checkbox("⏱️ 記錄效能數據", value=False, help="在診斷報告加上每個案件的解析、開檔、索引、渲染時間與記憶體高峰，並提供整批摘要 JSON 下載")
+    cache_limit_mb = st.number_input("快取上限 (MB)", min_value=16, value=DEFAULT_MAX_BYTES // (1024 * 1024), step=64, disabled=not use_figure_cache)
+
+
+    if word_files and st.button("🔄 開始智能整合", type="primary", disabled=integration_running):
+        # 寫入暫存檔在背景工作裡做 (有進度、可取消)；畫面端只交出上傳檔
+        params = {
+            "word_files": list(word_files), "pdf_files": list(pdf_files or []), "workers": int(workers),
+            # 另外產生縮圖給預覽用；縮圖選項不影響渲染結果與圖片快取
+            "incremental": incremental, "instrument": instrument, "settings": dict(render_settings, thumbnail=THUMBNAIL_PX),
+            "cache": FigureCache(max_bytes=int(cache_limit_mb) * 1024 * 1024) if use_figure_cache else None,
+            "integrator": st.session_state['integrator'], "pdf_store": st.session_state['pdf_store'],
+        }
+        job = registry.submit("integration", run_integration, params, owner=current_session_id())
+        st.session_state['integration_job'] = job.id
+        st.query_params['integration_job'] = job.id
+        st.rerun()
+
+    summary = st.session_state['integration_summary']
+    if summary is not None and summary["status"] == DONE:
+        result = summary["result"]
+        if result['parse_errors']:
+            st.error(f"有 {result['parse_errors']} 個 Word 檔解析失敗，原因請見診斷報告。")
+        if result['case_count']:
+            st.success(f"完成！共 {result['case_count']} 筆資料。")
+            if result['incremental']:
+                st.caption(f"⚡ 增量整合：重新解析 {result['parsed_count']} / {result['word_count']} 個 Word 檔，重新擷取 {result['extracted_count']} / {result['job_count']} 個案件的代表圖")
+            if result['use_cache']:
+                st.caption(f"💾 圖片快取：命中 {result['hits']} / 未命中 {result['misses']}")
         else:
             st.warning("無資料。")
+    elif summary is not None and summary["status"] == CANCELLED:
+        st.warning("已取消整合，保留上一次的結果。")
+    elif summary is not None and summary["status"] == FAILED:
+        st.error(f"整合失敗：{summary['error']}")
 
-    if st.session_state['slides_data']:
+    if st.session_state['slides_data'] or st.session_state['status_report']:
         st.divider()
         if st.button("🗑️ 清除重來"):
+            for job_key in ('integration_job', 'deck_job'):
+                registry.discard(st.session_state[job_key])
+                st.session_state[job_key] = None
+            st.query_params.clear()
+            st.session_state['integration_summary'] = None
+            st.session_state['deck'] = None
             st.session_state['slides_data'] = []
             st.session_state['status_report'] = []
+            st.session_state['run_key'] = ""
+            st.session_state['run_metrics'] = None
+            st.session_state['integrator'] = IncrementalIntegrator()
+            # 舊的暫存資料夾在取消中的工作放掉它之後由 PdfStore 自行刪除
+            st.session_state['pdf_store'] = PdfStore()
             st.rerun()
 
 # --- 主畫面 ---
-if not st.session_state['slides_data']:
+if integration_running:
+    st.subheader("📋 預覽 (整合中，依完成順序顯示)")
+    job_progress(integration_job.id, "整合", show_partial=True)
+elif not st.session_state['slides_data']:
     st.info("👈 請先上傳檔案。")
 else:
     st.subheader(f"📋 預覽 (已排序: 申請人 -> 日期)")
+    claim_groups = claim_split_stage(st.session_state['run_key'], st.session_state['slides_data'])
+    total = len(st.session_state['slides_data'])
+    page_col, size_col, count_col = st.columns([1, 1, 2])
+    with size_col:
+        page_size = st.selectbox("每頁筆數", PREVIEW_PAGE_SIZES, key="preview_page_size")
+    page_count = max(1, -(-total // page_size))
+    # 案件變少 (重新整合或改每頁筆數) 時頁次不能超過總頁數
+    if st.session_state.get("preview_page", 1) > page_count:
+        st.session_state["preview_page"] = 1
+    with page_col:
+        page = st.number_input("頁次", min_value=1, max_value=page_count, key="preview_page")
+    start = (int(page) - 1) * page_size
+    with count_col:
+        st.caption(f"共 {total} 筆，第 {start + 1}–{min(start + page_size, total)} 筆")
     cols = st.columns(3)
-    for i, data in enumerate(st.session_state['slides_data']):
-        with cols[i % 3]:
-            with st.container(border=True):
-                st.markdown(f"**Case {i+1}**")
-                st.caption(f"{data['sort_company']} | {data['sort_date']}")
-                st.text(data['case_info'][:80] + "...")
-                if data['image_data']: st.image(data['image_data'], use_column_width=True)
-                else: st.warning("無圖片")
-                
-                full_claim_text = data['claim_text']
-                claims_preview = split_claims_text(full_claim_text)
-                count_claims = len(claims_preview) if full_claim_text else 0
-                st.caption(f"Claim: {count_claims} 組 (預計 {count_claims} 頁)")
-
-    # --- PPT 生成邏輯 ---
-    def generate_ppt(slides_data, need_claim_slide):
-        prs = Presentation()
-        prs.slide_width = Inches(13.333)
-        prs.slide_height = Inches(7.5)
-        
-        for data in slides_data:
-            # === 第一頁：原本的內容 ===
-            slide = prs.slides.add_slide(prs.slide_layouts[6])
-            
-            # 左上：案號 (完整顯示)
-            left, top, width, height = Inches(0.5), Inches(0.5), Inches(5.0), Inches(2.0)
-            txBox = slide.shapes.add_textbox(left, top, width, height)
-            tf = txBox.text_frame; tf.word_wrap = True
-            
-            for line in data['case_info'].split('\n'):
-                if line.strip():
-                    p = tf.add_paragraph(); p.text = line.strip(); p.font.size = Pt(20); p.font.bold = True
-
-            # 右上：圖
-            img_left = Inches(5.5); img_top = Inches(0.5); img_height = Inches(4.0); img_width = Inches(7.0)
-            if data['image_data']:
-                slide.shapes.add_picture(BytesIO(data['image_data']), img_left, img_top, height=img_height)
-            else:
-                txBox = slide.shapes.add_textbox(img_left, img_top, img_width, img_height)
-                tf = txBox.text_frame; tf.word_wrap = True
-                content = data['rep_fig_text'] if data['rep_fig_text'].strip() else "無代表圖資訊"
-                for line in content.split('\n'):
-                    if line.strip():
-                        p = tf.add_paragraph(); p.text = line.strip(); p.font.size = Pt(16)
-
-            # 中下 & 底部
-            left, top, width, height = Inches(0.5), Inches(4.8), Inches(12.3), Inches(1.5)
-            txBox = slide.shapes.add_textbox(left, top, width, height)
-            tf = txBox.text_frame; tf.word_wrap = True
-            p1 = tf.add_paragraph(); p1.text = "• 解決問題：" + data['problem']; p1.font.size = Pt(18); p1.space_after = Pt(12)
-            p2 = tf.add_paragraph(); p2.text = "• 發明精神：" + data['spirit']; p2.font.size = Pt(18)
-
-            left, top, width, height = Inches(0.5), Inches(6.5), Inches(12.3), Inches(0.8)
-            shape = slide.shapes.add_shape(MSO_SHAPE.RECTANGLE, left, top, width, height)
-            shape.fill.solid(); shape.fill.fore_color.rgb = RGBColor(255, 192, 0); shape.line.color.rgb = RGBColor(255, 192, 0)
-            p = shape.text_frame.paragraphs[0]; p.text = data['key_point']; p.alignment = PP_ALIGN.CENTER; p.font.size = Pt(20); p.font.bold = True
-            shape.text_frame.vertical_anchor = MSO_SHAPE.RECTANGLE
-
-            # === Claim 分頁邏輯 (如果勾選) ===
-            if need_claim_slide:
-                claims_groups = split_claims_text(data['claim_text'])
-                
-                if not claims_groups and data['claim_text'].strip():
-                     claims_groups = [data['claim_text'].split('\n')]
-
-                for claim_lines in claims_groups:
-                    slide_c = prs.slides.add_slide(prs.slide_layouts[6])
-                    
-                    # 2.1 左上：案號 (同首頁)
-                    left, top, width, height = Inches(0.5), Inches(0.5), Inches(5.0), Inches(2.0)
-                    txBox = slide_c.shapes.add_textbox(left, top, width, height)
-                    tf = txBox.text_frame; tf.word_wrap = True
-                    for line in data['case_info'].split('\n'):
-                        if line.strip():
-                            p = tf.add_paragraph(); p.text = line.strip(); p.font.size = Pt(20); p.font.bold = True
-                    
-                    # 2.2 中間：Claim 內容 (保留縮排)
-                    left, top, width, height = Inches(0.5), Inches(2.5), Inches(12.3), Inches(4.5)
-                    txBox = slide_c.shapes.add_textbox(left, top, width, height)
-                    tf = txBox.text_frame; tf.word_wrap = True
-                    
-                    p_title = tf.add_paragraph()
-                    p_title.text = "【獨立項 Claim】"
-                    p_title.font.size = Pt(24); p_title.font.bold = True; p_title.font.color.rgb = RGBColor(0, 112, 192)
-                    p_title.space_after = Pt(10)
-                    
-                    for line in claim_lines:
-                        clean_line = line.strip()
-                        if clean_line:
-                            p = tf.add_paragraph()
-                            p.text = clean_line
-                            p.font.size = Pt(14) 
-                            p.space_after = Pt(4)
-                            
-                            # === 關鍵縮排對應 (針對您的截圖) ===
-                            # Level 0 (標題): 包含 (Claim X) 或黑點開頭
-                            if "(Claim" in line or "獨立項" in line or clean_line.startswith(('•', '●')):
-                                p.level = 0
-                                p.font.bold = True
-                            # Level 1: 空心圓 o, ○
-                            elif clean_line.startswith(('o ', '○', 'O ')):
-                                p.level = 1
-                            # Level 2: 實心方塊 ▪, ■
-                            elif clean_line.startswith(('▪', '■')):
-                                p.level = 2
-                            # Level 1: 減號 -, 數字 1.
-                            elif clean_line.startswith(('- ', '1.', '2.')):
-                                p.level = 1
-
-        return prs
+    for i in range(start, min(start + page_size, total)):
+        with cols[(i - start) % 3]:
+            render_case_card(i, st.session_state['slides_data'][i], len(claim_groups[i]), full_key=f"full-{st.session_state['run_key'][:12]}-{i}")
 
     st.divider()
-    if st.button("🚀 生成 PowerPoint (.pptx)", type="primary"):
-        prs = generate_ppt(st.session_state['slides_data'], add_claim_slide)
-        binary_output = BytesIO()
-        prs.save(binary_output)
-        binary_output.seek(0)
-        st.download_button("📥 下載 PPT", binary_output, "slides_with_claims.pptx")
+    deck_request = (st.session_state['run_key'], add_claim_slide, output_options)
+    deck = st.session_state['deck']
+    if deck is not None and deck.get('request', deck_request) != deck_request:
+        deck = None
+    if st.button("🚀 生成 PowerPoint (.pptx)", type="primary", disabled=deck_job is not None):
+        if deck is None or deck['status'] != DONE:
+            params = {
+                "request": deck_request, "slides_data": st.session_state['slides_data'], "need_claim_slide": add_claim_slide,
+                "claim_groups": claim_groups, "output_options": output_options, "workers": int(workers),
+            }
+            job = registry.submit("deck", run_deck, params, owner=current_session_id())
+            st.session_state['deck_job'] = job.id
+            st.session_state['deck'] = None
+            st.query_params['deck_job'] = job.id
+            st.rerun()
+    # 下載按鈕會觸發重跑；產生好的簡報存在 session 中，按鈕不會消失也不會重新產生
+    if deck_job is not None:
+        job_progress(deck_job.id, "產生簡報")
+    elif deck is not None and deck['status'] == DONE:
+        if output_options[0] == "單一檔案":
+            st.download_button("📥 下載 PPT", deck['bytes'], "slides_with_claims.pptx")
+        else:
+            st.download_button("📥 下載 PPT (zip)", deck['bytes'], "slides_with_claims.zip", mime="application/zip")
+    elif deck is not None and deck['status'] == CANCELLED:
+        st.caption("已取消產生簡報。")
+    elif deck is not None and deck['status'] == FAILED:
+        st.error(f"產生簡報失敗：{deck['error']}")
 
+if st.session_state['status_report']:
     st.divider()
     st.subheader("📊 診斷報告")
-    if st.session_state['status_report']:
-        st.dataframe(pd.DataFrame(st.session_state['status_report']), hide_index=True)
+    st.dataframe(pd.DataFrame(st.session_state['status_report']), hide_index=True)
+    if st.session_state['run_metrics'] is not None:
+        summary = summarize_run(st.session_state['status_report'], st.session_state['run_metrics']["階段時間(ms)"])
+        with st.expander("⏱️ 效能摘要", expanded=True):
+            st.json(summary)
+        metrics_json = json.dumps({"summary": summary, "cases": st.session_state['status_report']}, ensure_ascii=False, indent=2)
+        st.download_button("📥 下載效能數據 (JSON)", metrics_json, "run_metrics.json", mime="application/json")
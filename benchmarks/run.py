@@ -0,0 +1,144 @@
+"""
+效能基準測試：以合成資料分別量測各處理階段，結果存成 JSON 供比較。
+
+    python -m benchmarks.run --scales 10,50,200 --out bench.json
+    python -m benchmarks.run --scales 10,50 --compare bench.json   # 比對上次結果，變慢超過門檻時回傳 1
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from io import BytesIO
+
+from benchmarks.synthetic import make_corpus
+from pdf_figures import _figure_index_cache, clip_render_settings, extract_specific_figure_from_pdf
+from pipeline import match_cases
+from ppt_builder import generate_ppt, split_claims_text
+from word_parser import parse_docx
+
+
+class _NamedBytes(BytesIO):
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def _timed(fn, repeat):
+    """執行 repeat 次，回傳 (每次秒數, 最後一次的回傳值)"""
+    seconds = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    return seconds, result
+
+
+def bench_scale(n_cases, repeat, pdf_text_pages, pdf_fig_count):
+    word_files, pdf_file_map = make_corpus(n_cases, pdf_text_pages=pdf_text_pages, pdf_fig_count=pdf_fig_count)
+    results = {}
+
+    def parse():
+        cases = []
+        for name, data in word_files:
+            cases.extend(parse_docx(_NamedBytes(name, data)))
+        return cases
+    results["parse_word_file"], cases = _timed(parse, repeat)
+
+    results["pdf_matching"], matches = _timed(lambda: match_cases(cases, pdf_file_map), repeat)
+
+    def extract():
+        # 每輪清掉記憶體中的圖號索引，量的是冷啟動 (第一次看到這批 PDF) 的成本
+        _figure_index_cache.clear()
+        for case, (pk, _, _) in zip(cases, matches):
+            if pk:
+                case["image_data"], _ = extract_specific_figure_from_pdf(pdf_file_map[pk], case["rep_fig_text"])
+    results["extract_specific_figure_from_pdf"], _ = _timed(extract, repeat)
+
+    def extract_clip():
+        # 同樣冷啟動，改用裁切模式 (只渲染圖區)；結果不寫回案件，後面的 generate_ppt 仍用整頁圖比較
+        _figure_index_cache.clear()
+        settings = clip_render_settings()
+        for case, (pk, _, _) in zip(cases, matches):
+            if pk:
+                extract_specific_figure_from_pdf(pdf_file_map[pk], case["rep_fig_text"], settings=settings)
+    results["extract_specific_figure_from_pdf[clip]"], _ = _timed(extract_clip, repeat)
+
+    results["split_claims_text"], _ = _timed(lambda: [split_claims_text(c["claim_text"]) for c in cases], repeat)
+
+    results["generate_ppt"], prs = _timed(lambda: generate_ppt(cases, True), repeat)
+
+    def save():
+        output = BytesIO()
+        prs.save(output)
+        return output.tell()
+    results["prs.save"], deck_size = _timed(save, repeat)
+
+    rows = []
+    for stage, seconds in results.items():
+        rows.append({
+            "stage": stage, "cases": n_cases, "seconds": seconds,
+            "median": statistics.median(seconds), "min": min(seconds),
+        })
+    return rows, {"cases": n_cases, "parsed_cases": len(cases), "deck_bytes": deck_size}
+
+
+def compare(rows, baseline_path, threshold, min_seconds):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["stage"], r["cases"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for row in rows:
+        old = baseline.get((row["stage"], row["cases"]))
+        if not old or old["median"] <= 0:
+            continue
+        ratio = row["median"] / old["median"]
+        # 只有幾毫秒的階段誤差太大，低於 min_seconds 不判定退步
+        slow = ratio > 1 + threshold and row["median"] >= min_seconds
+        flag = "  <-- 變慢" if slow else ""
+        print(f"{row['stage']:<40}{row['cases']:>6}  {old['median']:.4f}s -> {row['median']:.4f}s  x{ratio:.2f}{flag}")
+        if flag:
+            regressions.append(row)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PPT 重組生成器效能基準測試")
+    parser.add_argument("--scales", default="10,50,200", help="案件數，以逗號分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每個階段重複次數")
+    parser.add_argument("--pdf-pages", type=int, default=20, help="每份 PDF 的說明書文字頁數")
+    parser.add_argument("--pdf-figs", type=int, default=8, help="每份 PDF 的附圖數")
+    parser.add_argument("--out", help="結果 JSON 輸出路徑")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=0.2, help="中位數變慢超過此比例視為退步 (預設 0.2 = 20%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="中位數低於此秒數的階段不判定退步")
+    args = parser.parse_args(argv)
+
+    rows, corpora = [], []
+    for n_cases in (int(s) for s in args.scales.split(",") if s.strip()):
+        scale_rows, corpus = bench_scale(n_cases, args.repeat, args.pdf_pages, args.pdf_figs)
+        rows.extend(scale_rows)
+        corpora.append(corpus)
+        for row in scale_rows:
+            print(f"{row['stage']:<40}{row['cases']:>6}  median {row['median']:.4f}s  min {row['min']:.4f}s")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat,
+            "pdf_pages": args.pdf_pages, "pdf_figs": args.pdf_figs, "corpora": corpora,
+        },
+        "results": rows,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.out}")
+    if args.compare:
+        return 1 if compare(rows, args.compare, args.threshold, args.min_seconds) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
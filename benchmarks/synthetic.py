@@ -0,0 +1,99 @@
+"""
+合成測試資料：NBLM 格式的 Word 匯出檔與專利 PDF (前段文字頁、後段附圖頁)。
+所有內容由 seed 決定，同樣參數每次產生相同的檔案。
+"""
+import random
+from io import BytesIO
+
+import docx
+import fitz  # PyMuPDF
+
+COMPANIES = ["ACME Corp", "Globex Inc", "Initech Ltd", "Umbrella Co", "Hooli LLC", "Stark Industries"]
+
+
+def case_number(i):
+    return f"US{10000000 + i}B2"
+
+
+def _claim_tree(rng, claim_no, fig_no):
+    lines = [f"• 一種裝置，對應 FIG.{fig_no} (Claim {claim_no})"]
+    for e in range(rng.randint(2, 4)):
+        lines.append(f"o 元件 {10 * (e + 1)}：用於處理訊號的模組")
+        for s in range(rng.randint(0, 2)):
+            lines.append(f"▪ 子元件 {10 * (e + 1) + s + 1}：連接至元件 {10 * (e + 1)}")
+    return lines
+
+
+# --- 產生 Word：n_cases 個案件，每隔 table_every 個案件把案號資訊放在表格內 ---
+def make_docx(n_cases, seed=0, start=0, table_every=4, claims_per_case=3):
+    rng = random.Random(seed)
+    d = docx.Document()
+    for i in range(start, start + n_cases):
+        company = rng.choice(COMPANIES)
+        date = f"20{rng.randint(10, 23)}-{rng.randint(1, 12)}-{rng.randint(1, 28)}"
+        info = f"1. 案號 / 日期 / 公司：{case_number(i)} / {date}"
+        if table_every and i % table_every == 0:
+            table = d.add_table(rows=2, cols=2)
+            table.cell(0, 0).text = info
+            table.cell(1, 0).text = f"申請人：{company}"
+            table.cell(1, 1).text = "備註"
+        else:
+            d.add_paragraph(info)
+            d.add_paragraph(f"申請人：{company}")
+        d.add_paragraph("2. 解決問題：" + "習知技術在高負載時效率不佳。" * rng.randint(1, 4))
+        d.add_paragraph("3. 發明精神：" + "以分層架構降低延遲並提高吞吐量。" * rng.randint(1, 4))
+        d.add_paragraph("4. 一句重點：分層處理降低延遲")
+        figs = rng.sample(range(1, 9), 3)
+        d.add_paragraph(f"5. 代表圖：FIG.{figs[0]}")
+        for fig in figs[1:]:
+            d.add_paragraph(f"FIG.{fig}：系統方塊圖")
+        d.add_paragraph("6. 獨立項claim：")
+        for c in range(claims_per_case):
+            for line in _claim_tree(rng, 1 + c * 10, figs[c % len(figs)]):
+                d.add_paragraph(line)
+    output = BytesIO()
+    d.save(output)
+    return output.getvalue()
+
+
+# --- 產生專利 PDF：text_pages 頁說明書文字 + fig_count 頁附圖 (每頁一或兩個圖) ---
+# 圖號只出現在附圖頁；說明書文字只提元件符號，圖號搜尋一定要找到後段的附圖頁才算數
+def make_patent_pdf(case_no, text_pages=20, fig_count=8, seed=0):
+    rng = random.Random(seed)
+    doc = fitz.open()
+    total_sheets = (fig_count + 1) // 2
+    for p in range(text_pages):
+        page = doc.new_page()
+        body = f"{case_no}  column {p + 1}\n" + "\n".join(
+            f"[{p:04d}{k:02d}] As shown in the drawings, the module {10 * rng.randint(1, fig_count)} processes the signal."
+            for k in range(40)
+        )
+        page.insert_textbox(fitz.Rect(50, 50, 560, 760), body, fontsize=8)
+    fig = 1
+    for sheet in range(total_sheets):
+        page = doc.new_page()
+        page.insert_text((60, 40), f"U.S. Patent   {case_no}   Sheet {sheet + 1} of {total_sheets}", fontsize=9)
+        for slot in range(2 if fig < fig_count else 1):
+            top = 80 + slot * 350
+            for _ in range(rng.randint(5, 15)):
+                x, y = rng.uniform(80, 450), rng.uniform(top, top + 250)
+                page.draw_rect(fitz.Rect(x, y, x + rng.uniform(20, 100), y + rng.uniform(20, 60)))
+                page.draw_line((x, y), (rng.uniform(80, 530), rng.uniform(top, top + 280)))
+            page.insert_text((260, top + 310), f"FIG. {fig}", fontsize=14)
+            fig += 1
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+# --- 產生整組資料：Word 檔 (每檔 cases_per_docx 個案件) 與 {正規化檔名: PDF bytes} ---
+def make_corpus(n_cases, cases_per_docx=50, pdf_text_pages=20, pdf_fig_count=8, seed=0):
+    word_files = []
+    for n, start in enumerate(range(0, n_cases, cases_per_docx)):
+        count = min(cases_per_docx, n_cases - start)
+        word_files.append((f"export_{n:03d}.docx", make_docx(count, seed=seed + n, start=start)))
+    pdf_file_map = {}
+    for i in range(n_cases):
+        key = case_number(i)[:-2]  # PDF 檔名不帶種類碼，走部分比對
+        pdf_file_map[key] = make_patent_pdf(case_number(i), pdf_text_pages, pdf_fig_count, seed=seed + i)
+    return word_files, pdf_file_map
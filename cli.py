@@ -0,0 +1,136 @@
+"""
+命令列批次模式：不啟動 Streamlit，直接把資料夾中的 Word / PDF 整合成簡報與診斷報告。
+
+    python cli.py --word-dir exports/ --pdf-dir patents/ --out output/ --claims --workers 8
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+
+from figure_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, FigureCache
+from instrumentation import METRIC_COLUMNS, Stopwatch, summarize_run
+from parallel import default_workers
+from pdf_figures import DEFAULT_RENDER_SETTINGS, MAX_FIGURES, clip_render_settings
+from pdf_matching import normalize_pdf_key
+from pipeline import integrate_cases, parse_word_files, sort_results
+from ppt_builder import build_deck_bytes, build_deck_zip, claim_groups_for_case, shard_cases
+
+REPORT_COLUMNS = ["來源", "案號", "公司", "日期", "狀態", "原因", "缺漏", "快取", "比對"]
+
+
+def list_files(directory, extension):
+    # 略過 Word 開檔時產生的 ~$ 暫存檔
+    paths = glob.glob(os.path.join(directory, f"*.{extension}")) + glob.glob(os.path.join(directory, f"*.{extension.upper()}"))
+    return sorted({p for p in paths if not os.path.basename(p).startswith("~$")})
+
+
+def write_report(status_report_list, out_dir, report_format, columns=REPORT_COLUMNS):
+    written = []
+    if report_format in ("csv", "both"):
+        path = os.path.join(out_dir, "status_report.csv")
+        # utf-8-sig 讓 Excel 直接開啟時中文不會亂碼
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(status_report_list)
+        written.append(path)
+    if report_format in ("json", "both"):
+        path = os.path.join(out_dir, "status_report.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(status_report_list, f, ensure_ascii=False, indent=2)
+        written.append(path)
+    return written
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Word + PDF 批次整合為 PPT (不需啟動 Streamlit)")
+    parser.add_argument("--word-dir", required=True, help="NBLM 匯出的 .docx 所在資料夾")
+    parser.add_argument("--pdf-dir", help="專利 PDF 所在資料夾 (檔名需含案號)")
+    parser.add_argument("--out", required=True, help="輸出資料夾")
+    parser.add_argument("--claims", action="store_true", help="產生 Claim 分頁")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="平行處理程序數 (預設: CPU 數 - 1)")
+    parser.add_argument("--render", choices=["clip", "page"], default="clip", help="clip: 只渲染圖區；page: 整頁 2 倍 PNG")
+    parser.add_argument("--image-format", choices=["png", "jpeg"], default="png", help="clip 模式的圖片格式")
+    parser.add_argument("--figures", type=int, default=1, help=f"每案最多擷取幾張代表圖 (提示詞建議 {MAX_FIGURES} 張)，多張時並排放在投影片上")
+    parser.add_argument("--no-cache", action="store_true", help="不使用磁碟圖片快取")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="圖片快取資料夾")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="圖片快取上限 (MB)")
+    parser.add_argument("--shard", choices=["none", "company", "budget"], default="none", help="分檔方式：不分檔 / 依申請人 / 依頁數與大小上限")
+    parser.add_argument("--max-slides", type=int, default=150, help="--shard budget 時每檔頁數上限")
+    parser.add_argument("--max-mb", type=int, default=100, help="--shard budget 時每檔大小上限 (MB，0 = 不限)")
+    parser.add_argument("--report", choices=["csv", "json", "both"], default="both", help="診斷報告格式")
+    parser.add_argument("--metrics", action="store_true", help="記錄各階段時間與記憶體，寫入診斷報告欄位與 run_metrics.json")
+    parser.add_argument("--name", default="slides_with_claims", help="輸出檔名 (不含副檔名)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workers = max(1, args.workers)
+    os.makedirs(args.out, exist_ok=True)
+
+    word_paths = list_files(args.word_dir, "docx")
+    if not word_paths:
+        print(f"找不到 Word 檔案: {args.word_dir}", file=sys.stderr)
+        return 1
+    stage_timings = {}
+    parse_timings = {} if args.metrics else None
+    with Stopwatch(stage_timings, "解析"):
+        all_cases, parse_errors = parse_word_files(word_paths, workers=workers, parse_timings=parse_timings)
+
+    # PDF 只記路徑，由 MuPDF 在需要時開檔，不整份讀進記憶體
+    pdf_file_map = {}
+    if args.pdf_dir:
+        for path in list_files(args.pdf_dir, "pdf"):
+            pdf_file_map[normalize_pdf_key(os.path.basename(path))] = path
+
+    settings = clip_render_settings(fmt=args.image_format) if args.render == "clip" else DEFAULT_RENDER_SETTINGS
+    if args.figures > 1:
+        settings = dict(settings, max_figures=args.figures)
+    cache = None if args.no_cache else FigureCache(args.cache_dir, max_bytes=args.cache_mb * 1024 * 1024)
+    status_report_list, match_count = integrate_cases(
+        all_cases, pdf_file_map, workers=workers, cache=cache, settings=settings,
+        parse_timings=parse_timings, stage_timings=stage_timings
+    )
+    status_report_list = parse_errors + status_report_list
+    sort_results(all_cases, status_report_list)
+
+    columns = REPORT_COLUMNS + METRIC_COLUMNS if args.metrics else REPORT_COLUMNS
+    for path in write_report(status_report_list, args.out, args.report, columns):
+        print(f"診斷報告: {path}")
+    if not all_cases:
+        print("無資料。", file=sys.stderr)
+        return 1
+
+    claim_groups = [claim_groups_for_case(data) for data in all_cases]
+    if args.shard == "none":
+        deck_path = os.path.join(args.out, f"{args.name}.pptx")
+        deck_bytes = build_deck_bytes(all_cases, args.claims, claim_groups, stage_timings)
+        with open(deck_path, "wb") as f:
+            f.write(deck_bytes)
+    else:
+        shards = shard_cases(
+            all_cases, args.claims, claim_groups, by_company=(args.shard == "company"),
+            max_slides=args.max_slides if args.shard == "budget" else None,
+            max_bytes=args.max_mb * 1024 * 1024 if args.shard == "budget" and args.max_mb else None
+        )
+        deck_path = os.path.join(args.out, f"{args.name}.zip")
+        # 各分檔產生好就直接寫進輸出檔，不在記憶體中組出整個 zip
+        build_deck_zip(all_cases, args.claims, claim_groups, shards, workers=workers, timings=stage_timings, output=deck_path)
+
+    print(f"簡報: {deck_path}")
+    if args.metrics:
+        summary = summarize_run(status_report_list, stage_timings)
+        metrics_path = os.path.join(args.out, "run_metrics.json")
+        with open(metrics_path, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "cases": status_report_list}, f, ensure_ascii=False, indent=2)
+        print(f"效能數據: {metrics_path}")
+    print(f"完成！共 {len(all_cases)} 筆資料，{match_count} 筆找到代表圖，{len(parse_errors)} 個 Word 檔解析失敗。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# --- 代表圖快取：以 PDF 內容雜湊 + 頁碼 + 渲染設定為鍵，存放渲染好的圖片 (圖號索引也以同樣方式存在這裡) ---
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PPT_MAKER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "my-ppt-maker", "figures")
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class FigureCache:
+    """
+    磁碟上的內容定址快取，容量超過 max_bytes 時依最後使用時間 (檔案 mtime) 淘汰最舊的項目。
+    只存放路徑與上限，可以直接傳給子程序使用；多個程序同時寫入時以 os.replace 保證檔案完整。
+    目前總量只在第一次寫入時掃描一次目錄，之後累加估算，超過上限才重新掃描並淘汰。
+    傳給子程序 (pickle) 前先在父程序量好總量，每個任務收到的副本都帶著它，不會各自再掃描一次目錄。
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._total = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def __getstate__(self):
+        if self._total is None:
+            self._total = self.size()
+        return self.__dict__.copy()
+
+    @staticmethod
+    def make_key(pdf_hash, page_index, settings):
+        token = json.dumps(settings, sort_keys=True)
+        return hashlib.sha1(f"{pdf_hash}|{page_index}|{token}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        if self._total is None:
+            self._total = self.size()
+        else:
+            self._total += len(data)
+        if self._total > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._total = total
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._total = 0
@@ -0,0 +1,104 @@
+import sys
+import threading
+import time
+import tracemalloc
+
+# --- 效能數據：每個案件在診斷報告中多出的欄位 ---
+PARSE_MS = "解析(ms)"  # 案件所屬 Word 檔的整檔解析時間
+OPEN_MS = "開檔(ms)"
+INDEX_MS = "索引(ms)"
+PAGES_SCANNED = "掃描頁數"
+RENDER_MS = "渲染(ms)"
+RENDERED_BYTES = "渲染位元組"
+PEAK_MB = "峰值記憶體(MB)"
+METRIC_COLUMNS = [PARSE_MS, OPEN_MS, INDEX_MS, PAGES_SCANNED, RENDER_MS, RENDERED_BYTES, PEAK_MB]
+
+
+def empty_metrics():
+    return {OPEN_MS: 0.0, INDEX_MS: 0.0, PAGES_SCANNED: 0, RENDER_MS: 0.0, RENDERED_BYTES: 0, PEAK_MB: 0.0}
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class Stopwatch:
+    """with Stopwatch(timings, "key"): ... 把經過時間 (ms) 累加到 timings["key"]"""
+
+    def __init__(self, timings, key):
+        self.timings = timings
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings[self.key] = round(self.timings.get(self.key, 0) + elapsed_ms(self.start), 1)
+        return False
+
+
+# --- 記憶體：tracemalloc 只量得到 Python 配置的記憶體 (MuPDF 的 C 配置不在內)，行程整體高峰另看 max RSS ---
+# tracemalloc 是整個程序共用的：多個 session 的工作同時在執行緒中記錄時，以使用計數決定何時關閉，
+# 最後一個使用者結束才停止；在這之前已經由別人開啟的追蹤不會被關掉
+_tracking_lock = threading.Lock()
+_tracking_users = 0
+_tracking_started = False
+
+
+def start_memory_tracking():
+    """開始追蹤 (與 stop_memory_tracking 成對呼叫)"""
+    global _tracking_users, _tracking_started
+    with _tracking_lock:
+        if _tracking_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracking_started = True
+        _tracking_users += 1
+
+
+def stop_memory_tracking():
+    global _tracking_users, _tracking_started
+    with _tracking_lock:
+        _tracking_users -= 1
+        if _tracking_users == 0 and _tracking_started:
+            tracemalloc.stop()
+            _tracking_started = False
+
+
+def reset_peak_memory():
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def peak_memory_mb():
+    if not tracemalloc.is_tracing():
+        return 0.0
+    return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+
+
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位是 KB，macOS 是 bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --- 整批摘要：各階段時間加總與各欄位統計 ---
+def summarize_run(status_report_list, stage_timings):
+    summary = {"階段時間(ms)": dict(stage_timings), "案件數": len(status_report_list)}
+    # 解析(ms) 是整份 Word 的時間，同檔案的每個案件都帶同一個值，加總沒有意義，整體時間看階段時間
+    for column in METRIC_COLUMNS[1:]:
+        values = [row[column] for row in status_report_list if isinstance(row.get(column), (int, float))]
+        if not values:
+            continue
+        if column == PEAK_MB:
+            summary[column] = max(values)
+        else:
+            summary[column + "合計"] = round(sum(values), 1)
+    rss = max_rss_mb()
+    if rss is not None:
+        summary["行程最大 RSS(MB)"] = rss
+    return summary
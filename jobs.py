@@ -0,0 +1,185 @@
+# --- 背景工作：整合與產生簡報在背景執行緒中跑，畫面只負責顯示進度 ---
+# Streamlit 每次互動 (包含下載、勾選) 都會重跑腳本，瀏覽器重新整理還會換一個新的 session；
+# 工作本身放在程序層級的 JobRegistry，畫面重跑或重新整理後以工作 ID 重新接上，不會中斷或重做。
+# 每個工作記錄擁有者 (session)；結果由擁有者取走 (release) 後就從登記表移除，不會留在程序裡。
+import threading
+import time
+import traceback
+import uuid
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# 已結束、尚未被取走的工作結果合計上限 (圖片、簡報等 bytes)
+DEFAULT_MAX_RESULT_BYTES = 256 * 1024 * 1024
+
+
+class JobCancelled(Exception):
+    """使用者按下取消；由工作函數在檢查點拋出"""
+
+
+def payload_bytes(obj, seen=None):
+    """結果中 bytes 的總量 (走訪 dict / list / tuple)，給登記表估算記憶體用；同一個 bytes 物件只算一次 (figures 與 image_data 共用)"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    if isinstance(obj, (bytes, bytearray)):
+        seen.add(id(obj))
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(payload_bytes(v, seen) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(payload_bytes(v, seen) for v in obj)
+    return 0
+
+
+class Job:
+    """
+    工作函數在背景執行緒中更新進度 (stage / done / total) 並把完成的項目 append 到 partial，
+    畫面端以 snapshot() 取得一致的副本顯示。取消是協作式的：工作函數在檢查點呼叫 check_cancelled()。
+    工作結束時 params 與 partial 即釋放，result 留到擁有者 release()。
+    """
+
+    def __init__(self, kind, params=None, owner=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.owner = owner
+        self.status = RUNNING
+        self.stage = ""
+        self.done = 0
+        self.total = 0
+        self.partial = []
+        self.result = None
+        self.result_bytes = 0
+        self.error = ""
+        self.started = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage, total=0):
+        with self._lock:
+            self.stage = stage; self.done = 0; self.total = total
+
+    def advance(self, count=1, items=()):
+        """完成 count 個單位；items 是可以先顯示的完成項目"""
+        with self._lock:
+            self.done += count
+            self.partial.extend(items)
+        self.check_cancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    @property
+    def running(self):
+        return self.status == RUNNING
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "status": self.status, "stage": self.stage, "done": self.done, "total": self.total,
+                "partial": list(self.partial), "error": self.error,
+                "elapsed": (self.finished or time.time()) - self.started,
+            }
+
+
+class JobRegistry:
+    """
+    程序內所有 session 共用；已結束、尚未取走的結果合計超過 max_result_bytes 時，從最舊的開始釋放。
+    只釋放擁有者已經不在 (owner_alive(擁有者) 為 False) 的工作，剛結束的工作一律保留；
+    被釋放的工作改為 FAILED 並留下原因，接手的 session 看得到發生了什麼事。
+    """
+
+    def __init__(self, max_result_bytes=DEFAULT_MAX_RESULT_BYTES, owner_alive=None):
+        self.max_result_bytes = max_result_bytes
+        self.owner_alive = owner_alive or (lambda owner: True)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, params=None, owner=""):
+        """在背景執行緒執行 fn(job, params)；fn 的回傳值存在 job.result。owner 是提交工作的 session"""
+        job = Job(kind, params, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+        threading.Thread(target=self._run, args=(job, fn), name=f"job-{kind}-{job.id}", daemon=True).start()
+        return job
+
+    def _run(self, job, fn):
+        try:
+            result = fn(job, job.params)
+            status = DONE
+        except JobCancelled:
+            result = None; status = CANCELLED
+        except Exception as e:
+            result = None; status = FAILED
+            job.error = f"{e}\n{traceback.format_exc()}"
+        with job._lock:
+            job.result = result
+            job.result_bytes = payload_bytes(result)
+            job.params = None
+            job.partial = []
+            job.status = status
+            job.finished = time.time()
+        with self._lock:
+            self._prune(keep=job)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def claim(self, job_id, owner, owner_alive):
+        """
+        回傳屬於 owner 的工作；工作屬於其他 session 時，只有在原擁有者已經不在
+        (owner_alive(原擁有者) 為 False，例如瀏覽器重新整理) 才改由 owner 接手，否則回傳 None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id) if job_id else None
+            if job is None or job.owner == owner:
+                return job
+            if owner_alive(job.owner):
+                return None
+            job.owner = owner
+            return job
+
+    def release(self, job_id):
+        """取走已結束工作的結果並從登記表移除"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return None
+        with job._lock:
+            result, job.result = job.result, None
+        return result
+
+    def discard(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job.cancel()
+
+    def _prune(self, keep=None):
+        finished = sorted((job for job in self._jobs.values() if not job.running), key=lambda job: job.finished)
+        total = sum(job.result_bytes for job in finished)
+        for job in finished:
+            if total <= self.max_result_bytes:
+                break
+            if job is keep or not job.result_bytes or self.owner_alive(job.owner):
+                continue
+            with job._lock:
+                job.result = None
+                job.status = FAILED
+                job.error = f"結果 ({job.result_bytes / (1024 * 1024):.0f} MB) 等待接收時超過暫存上限，已釋放；請重新執行"
+            total -= job.result_bytes
+            job.result_bytes = 0
@@ -0,0 +1,25 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# 子程序要執行的工作函數都在可匯入的模組裡 (不在 app.py)，forkserver 先載入這些模組，之後每個子程序直接從它分出
+WORKER_MODULES = ["pipeline", "ppt_builder"]
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def process_pool(max_workers):
+    """
+    建立程序池。PyMuPDF / python-pptx 物件不能跨執行緒共用，所以一律用獨立程序。
+    不用 fork：Streamlit 與背景工作都有其他執行緒，fork 只複製目前的執行緒，鎖可能停在被持有的狀態。
+    能用 forkserver 時用 forkserver (預先載入 WORKER_MODULES)，否則用 spawn；
+    兩者都會以 __mp_main__ 重新匯入主程式，Streamlit 的啟動程式與 cli.py 都有 __main__ 判斷，不會重跑。
+    """
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(WORKER_MODULES)
+    else:
+        ctx = mp.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
@@ -0,0 +1,502 @@
+import hashlib
+import json
+import re
+import time
+import zlib
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+from instrumentation import (
+    INDEX_MS, OPEN_MS, PAGES_SCANNED, PEAK_MB, RENDER_MS, RENDERED_BYTES,
+    elapsed_ms, empty_metrics, peak_memory_mb, reset_peak_memory, start_memory_tracking, stop_memory_tracking,
+)
+
+# --- 圖號標籤：FIG.3 / FIGS. 3 / Figure 3A / 圖3 一律正規化為 FIG3、FIG3A ---
+FIG_LABEL_PATTERN = re.compile(r'(?:FIGURE|FIGS?\.?|圖)\s*([0-9]+)([A-Z]?)')
+# 去掉圖號後還有文字 (英文字母或中文) 的區塊是說明書內文，不是附圖上的圖號
+STANDALONE_LABEL_REMAINDER = re.compile(r'[A-Z\u4e00-\u9fff]')
+
+# 渲染設定 (也是圖片快取鍵的一部分，設定不同就不會共用快取)
+# mode: "page" 整頁依 zoom 倍率渲染；"clip" 只渲染圖區，解析度依投影片圖框大小與 dpi 計算
+# max_figures (可省略，預設 1)：說明文字列出多個圖號時最多擷取幾張
+# thumbnail (可省略)：另外產生長邊這麼多像素的 JPEG 縮圖給預覽畫面用
+# 這兩項不影響單張圖的渲染，不列入圖片快取鍵
+DEFAULT_RENDER_SETTINGS = {"mode": "page", "zoom": 2, "format": "png"}
+EXTRACT_OPTIONS = ("max_figures", "thumbnail")
+
+# NBLM 提示詞要求每案建議 3 張代表圖
+MAX_FIGURES = 3
+
+# 預覽縮圖長邊像素與 JPEG 品質
+THUMBNAIL_PX = 320
+THUMBNAIL_QUALITY = 70
+
+# generate_ppt 右上代表圖圖框 (寬, 高) 與多張圖並排時的間距，單位英吋
+FIGURE_BOX_INCHES = (7.0, 4.0)
+FIGURE_GAP_INCHES = 0.15
+
+# 裁切模式：頁首 / 頁尾的頁碼、專利號不算圖區 (佔頁高比例)；圖區外留白 (pt)
+CLIP_HEADER_RATIO = 0.08
+CLIP_FOOTER_RATIO = 0.05
+CLIP_PADDING = 12
+
+# 記憶體中的索引快取上限 (每個程序各一份)：索引保留每頁全文給關鍵字備援搜尋，頁數多的 PDF 一筆就有數 MB，
+# 所以依文字總量而不是筆數限制；超過時淘汰最久沒用的 (磁碟快取裡還有，需要時再讀回來)
+FIGURE_INDEX_CACHE_BYTES = 32 * 1024 * 1024
+_figure_index_cache = OrderedDict()
+# 索引也存進圖片快取 (以內容雜湊為鍵)，下次執行不必重新擷取全文；索引格式改變時遞增，舊的項目自然失效
+FIGURE_INDEX_VERSION = 2
+
+
+def pdf_content_hash(pdf_source):
+    """pdf_source 可以是 PDF 內容 (bytes) 或檔案路徑；路徑會分段讀取，不整份載入記憶體"""
+    if isinstance(pdf_source, str):
+        digest = hashlib.sha1()
+        with open(pdf_source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    return hashlib.sha1(pdf_source).hexdigest()
+
+
+def open_pdf(pdf_source):
+    """路徑直接由 MuPDF 開檔 (按需讀取頁面)，bytes 則從記憶體開啟"""
+    if isinstance(pdf_source, str):
+        return fitz.open(pdf_source, filetype="pdf")
+    return fitz.open(stream=pdf_source, filetype="pdf")
+
+
+def normalize_fig_label(text):
+    """回傳 (正規化標籤, 顯示用文字)，例如 'Fig. 3a' -> ('FIG3A', 'FIG.3A')；找不到則回傳 (None, None)"""
+    match = FIG_LABEL_PATTERN.search(text.upper())
+    if not match:
+        return None, None
+    return f"FIG{match.group(1)}{match.group(2)}", match.group(0).replace(" ", "")
+
+
+def fig_labels(text):
+    """說明文字中所有圖號，依出現順序去除重複：'FIG.3、FIG. 5' -> [('FIG3', 'FIG.3'), ('FIG5', 'FIG.5')]"""
+    labels = {}
+    for line in text.split('\n'):
+        for match in FIG_LABEL_PATTERN.finditer(line.upper()):
+            labels.setdefault(f"FIG{match.group(1)}{match.group(2)}", match.group(0).replace(" ", ""))
+    return list(labels.items())
+
+
+class FigureIndex:
+    """
+    單份 PDF 的圖號索引：掃描一次所有頁面，記錄每個圖號標籤出現的頁碼。
+    labels: {'FIG3': [5, 12], 'FIG3A': [12], ...}
+    帶字尾的標籤 (FIG3A) 同時記在 FIG3 底下，與舊版子字串搜尋的行為一致，但 FIG3 不會再誤中 FIG30。
+    figure_labels: 標籤單獨成一個文字區塊的頁碼 (附圖頁的圖號)，說明書內文提到的圖號不算
+    image_pages: 有內嵌影像的頁碼 (掃描的附圖頁沒有可辨識的圖號區塊時用)
+    page_texts 保留去空白後的大寫頁面文字，給無法辨識圖號時的關鍵字備援搜尋使用。
+    """
+
+    def __init__(self, labels, page_texts, figure_labels=None, image_pages=()):
+        self.labels = labels
+        self.page_texts = page_texts
+        self.figure_labels = figure_labels or {}
+        self.image_pages = set(image_pages)
+
+    @property
+    def page_count(self):
+        return len(self.page_texts)
+
+    @property
+    def nbytes(self):
+        """估計佔用的記憶體 (頁面文字字元數)，給記憶體中的索引快取計算上限"""
+        return sum(len(text) for text in self.page_texts)
+
+    @classmethod
+    def from_document(cls, doc):
+        labels = {}
+        figure_labels = {}
+        image_pages = []
+        page_texts = []
+        for i, page in enumerate(doc):
+            blocks = [block[4].upper() for block in page.get_text("blocks") if block[6] == 0]
+            page_texts.append("".join(blocks).replace(" ", ""))
+            if page.get_images():
+                image_pages.append(i)
+            for text in blocks:
+                # 區塊裡除了圖號只剩數字、標點 (元件符號) 時，視為附圖頁上的圖號
+                standalone = not STANDALONE_LABEL_REMAINDER.search(FIG_LABEL_PATTERN.sub("", text))
+                for match in FIG_LABEL_PATTERN.finditer(text):
+                    base = f"FIG{match.group(1)}"
+                    for label in {base, base + match.group(2)}:
+                        for index in (labels, figure_labels) if standalone else (labels,):
+                            pages = index.setdefault(label, [])
+                            if not pages or pages[-1] != i:
+                                pages.append(i)
+        return cls(labels, page_texts, figure_labels, image_pages)
+
+    def pages_for(self, label):
+        return self.labels.get(label, [])
+
+    def find_page(self, label):
+        """優先取圖號單獨成區塊的頁 (附圖頁)，其次有內嵌影像的頁，都沒有才取第一個提到它的頁"""
+        figure_pages = self.figure_labels.get(label)
+        if figure_pages:
+            return figure_pages[0]
+        pages = self.pages_for(label)
+        for page_index in pages:
+            if page_index in self.image_pages:
+                return page_index
+        return pages[0] if pages else None
+
+    def to_bytes(self):
+        data = {
+            "labels": self.labels, "page_texts": self.page_texts,
+            "figure_labels": self.figure_labels, "image_pages": sorted(self.image_pages),
+        }
+        return zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, payload):
+        data = json.loads(zlib.decompress(payload).decode("utf-8"))
+        return cls(data["labels"], data["page_texts"], data["figure_labels"], data["image_pages"])
+
+    def find_text(self, keyword):
+        for i, page_text in enumerate(self.page_texts):
+            if keyword in page_text:
+                return i
+        return None
+
+
+def _index_cache_key(cache, content_hash):
+    return cache.make_key(content_hash, "index", {"version": FIGURE_INDEX_VERSION})
+
+
+def _remember_index(key, index):
+    _figure_index_cache[key] = index
+    total = sum(cached.nbytes for cached in _figure_index_cache.values())
+    # 最新的一筆一定留著，即使它本身就超過上限
+    while total > FIGURE_INDEX_CACHE_BYTES and len(_figure_index_cache) > 1:
+        _, evicted = _figure_index_cache.popitem(last=False)
+        total -= evicted.nbytes
+
+
+def cached_figure_index(content_hash, cache=None):
+    """只查記憶體與磁碟快取，不開檔；都沒有時回傳 None"""
+    index = _figure_index_cache.get(content_hash)
+    if index is not None:
+        _figure_index_cache.move_to_end(content_hash)
+        return index
+    payload = cache.get(_index_cache_key(cache, content_hash)) if cache else None
+    if payload is None:
+        return None
+    try:
+        index = FigureIndex.from_bytes(payload)
+    except (ValueError, KeyError, zlib.error):
+        return None
+    _remember_index(content_hash, index)
+    return index
+
+
+def get_figure_index(pdf_source, doc=None, content_hash=None, cache=None):
+    """依內容雜湊取得 (或建立) 圖號索引；同一份 PDF 只會做一次全文擷取，有 cache 時結果也存到磁碟"""
+    key = content_hash or pdf_content_hash(pdf_source)
+    index = cached_figure_index(key, cache)
+    if index is not None:
+        return index
+    if doc is None:
+        with open_pdf(pdf_source) as tmp_doc:
+            index = FigureIndex.from_document(tmp_doc)
+    else:
+        index = FigureIndex.from_document(doc)
+    _remember_index(key, index)
+    if cache:
+        cache.put(_index_cache_key(cache, key), index.to_bytes())
+    return index
+
+
+def clip_render_settings(dpi=150, fmt="png", quality=85, box=FIGURE_BOX_INCHES):
+    """裁切模式的渲染設定；fmt 可用 "png" (無損) 或 "jpeg" (依 quality 壓縮)"""
+    settings = {"mode": "clip", "dpi": dpi, "format": fmt, "box": list(box)}
+    if fmt == "jpeg":
+        settings["quality"] = quality
+    return settings
+
+
+def locate_figures(index, target_fig_text, max_figures=1):
+    """
+    依代表圖說明文字找出頁碼：說明文字列出的圖號依序各查一次索引 (最多 max_figures 個)，
+    沒有可辨識的圖號時退回以第一行前 10 字做關鍵字搜尋。
+    回傳 [(頁碼或 None, 正規化標籤或 None, 搜尋關鍵字, 錯誤訊息), ...]，至少一筆
+    """
+    if not target_fig_text:
+        return [(None, None, "", "Word 中未指定代表圖文字")]
+    search_keywords = fig_labels(target_fig_text)[:max_figures]
+    if not search_keywords:
+        target_keyword = target_fig_text.split('\n')[0].strip()[:10].replace(" ", "").upper()
+        if not target_keyword:
+            return [(None, None, "", "無法從說明文字中識別出圖號")]
+        search_keywords = [(None, target_keyword)]
+
+    located = []
+    for target_label, target_keyword in search_keywords:
+        found_page_index = index.find_page(target_label) if target_label else index.find_text(target_keyword)
+        if found_page_index is None:
+            located.append((None, target_label, target_keyword, f"PDF 中找不到關鍵字「{target_keyword}」"))
+        else:
+            located.append((found_page_index, target_label, target_keyword, ""))
+    return located
+
+
+def figure_cell_box(box, count):
+    """圖框均分成 count 格並排時每格的 (寬, 高)，與 ppt_builder 放圖的方式相同"""
+    width, height = box
+    return [(width - FIGURE_GAP_INCHES * (count - 1)) / count, height]
+
+
+def _union(rects):
+    x0 = min(r[0] for r in rects); y0 = min(r[1] for r in rects)
+    x1 = max(r[2] for r in rects); y1 = max(r[3] for r in rects)
+    return fitz.Rect(x0, y0, x1, y1)
+
+
+def _gap(a, b):
+    """兩個矩形之間的空白距離；重疊時為 0"""
+    dx = max(0, b[0] - a[2], a[0] - b[2])
+    dy = max(0, b[1] - a[3], a[1] - b[3])
+    return (dx * dx + dy * dy) ** 0.5
+
+
+def _split_by_gaps(rects, axis, min_gap=CLIP_PADDING):
+    """沿 axis (0 = 水平、1 = 垂直) 把矩形分成互不重疊的帶狀群組；相鄰兩群之間至少有 min_gap 的空白"""
+    groups = []
+    end = None
+    for r in sorted(rects, key=lambda r: r[axis]):
+        if end is None or r[axis] > end + min_gap:
+            groups.append([])
+            end = r[axis + 2]
+        groups[-1].append(r)
+        end = max(end, r[axis + 2])
+    return groups
+
+
+def _nearest(rect, anchors):
+    return min(anchors, key=lambda a: _gap(rect, a))
+
+
+def _assign_figure_groups(graphics, anchors):
+    """
+    把圖形元素切成一個個圖：先依垂直空白切成橫帶 (上下排列的圖)，
+    一條橫帶同時是多個標籤最近的一帶時 (左右並排的圖)，再依水平空白切成直欄。
+    每一群歸給空白距離最近的標籤；回傳 [(群組範圍, 標籤範圍), ...]
+    """
+    bands = [(_union(group), group) for group in _split_by_gaps(graphics, 1)]
+    owners = {}
+    for anchor in anchors:
+        owners.setdefault(min(range(len(bands)), key=lambda k: _gap(bands[k][0], anchor)), []).append(anchor)
+    assigned = []
+    for k, (band_rect, group) in enumerate(bands):
+        band_anchors = owners.get(k, [])
+        if len(band_anchors) > 1:
+            for column in _split_by_gaps(group, 0):
+                column_rect = _union(column)
+                assigned.append((column_rect, _nearest(column_rect, band_anchors)))
+        else:
+            assigned.append((band_rect, band_anchors[0] if band_anchors else _nearest(band_rect, anchors)))
+    return assigned
+
+
+# --- 函數：找出頁面上代表圖的範圍 ---
+def find_figure_region(page, label=None):
+    """
+    由繪圖路徑、內嵌影像與文字區塊推算圖區：
+    1. 排除頁首 / 頁尾帶狀區 (專利公報的頁碼、Sheet x of y)
+    2. 一頁有多個圖號時，依圖與圖之間的空白把圖形元素切成一個個圖，各歸給最近的圖號標籤，只保留目標標籤的圖
+    3. 沒有任何圖形元素 (純文字頁) 時退回文字區塊範圍；都找不到就回傳整頁
+    """
+    page_rect = page.rect
+    top = page_rect.y0 + page_rect.height * CLIP_HEADER_RATIO
+    bottom = page_rect.y1 - page_rect.height * CLIP_FOOTER_RATIO
+
+    def in_body(r):
+        return r[3] > top and r[1] < bottom
+
+    graphics = [tuple(d["rect"]) for d in page.get_drawings()]
+    graphics += [tuple(info["bbox"]) for info in page.get_image_info()]
+    graphics = [r for r in graphics if in_body(r)]
+
+    label_rects = {}
+    text_rects = []
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+        r = (x0, y0, x1, y1)
+        if block_type != 0 or not in_body(r):
+            continue
+        text_rects.append(r)
+        for match in FIG_LABEL_PATTERN.finditer(text.upper()):
+            base = f"FIG{match.group(1)}"
+            label_rects.setdefault(base + match.group(2), r)
+            label_rects.setdefault(base, r)
+
+    target_rect = label_rects.get(label) if label else None
+    if graphics and target_rect and len(set(label_rects.values())) > 1:
+        assigned = _assign_figure_groups(graphics, list(set(label_rects.values())))
+        groups = [group for group, anchor in assigned if anchor == target_rect]
+        # 目標標籤不是任何一群最近的標籤時，至少取離它最近的那一群
+        graphics = groups or [min((group for group, _ in assigned), key=lambda g: _gap(g, target_rect))]
+
+    members = graphics or text_rects
+    if not members:
+        return page_rect
+    if target_rect:
+        members = members + [target_rect]
+    region = _union(members)
+    region = fitz.Rect(region.x0 - CLIP_PADDING, region.y0 - CLIP_PADDING, region.x1 + CLIP_PADDING, region.y1 + CLIP_PADDING)
+    region &= page_rect
+    if region.is_empty or region.width < 36 or region.height < 36:
+        return page_rect
+    return region
+
+
+def render_page(doc, page_index, settings=DEFAULT_RENDER_SETTINGS, label=None):
+    page = doc[page_index]
+    if settings.get("mode") == "clip":
+        clip = find_figure_region(page, label)
+        box_w, box_h = settings["box"]
+        # 圖片會等比縮放放進圖框，以較緊的那一邊決定需要的像素數
+        zoom = min(box_w * settings["dpi"] / clip.width, box_h * settings["dpi"] / clip.height)
+        zoom = max(0.5, min(zoom, 8))
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)
+    else:
+        mat = fitz.Matrix(settings["zoom"], settings["zoom"])
+        pix = page.get_pixmap(matrix=mat)
+    if settings["format"] == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=settings.get("quality", 85))
+    return pix.tobytes(settings["format"])
+
+
+def make_thumbnail(img_data, max_px=THUMBNAIL_PX, quality=THUMBNAIL_QUALITY):
+    """渲染好的圖 (PNG / JPEG bytes) -> 長邊不超過 max_px 的 JPEG 縮圖"""
+    pix = fitz.Pixmap(img_data)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    scale = max_px / max(pix.width, pix.height)
+    if scale < 1:
+        pix = fitz.Pixmap(pix, max(1, int(pix.width * scale)), max(1, int(pix.height * scale)), None)
+    return pix.tobytes("jpeg", jpg_quality=quality)
+
+
+# --- 函數：同一份 PDF 一次處理多個案件 (只開檔一次，同頁只渲染一次) ---
+def extract_figures_from_pdf(pdf_stream, target_fig_texts, cache=None, settings=DEFAULT_RENDER_SETTINGS, instrument=False,
+                             content_hash=None):
+    """
+    pdf_stream 可以是 PDF 內容 (bytes) 或檔案路徑；已知內容雜湊時由 content_hash 傳入，省去重新計算。
+    回傳與 target_fig_texts 同順序的 [(圖片 bytes 或 None, 訊息, 附加資訊), ...]
+    附加資訊有 "cache"：命中 / 未命中 / "" (未使用快取或沒有渲染)；同一案件多張圖時任一張未命中即為未命中；
+    settings["max_figures"] > 1 時另有 "figures"：找到的各張圖 (依說明文字順序、同圖只留一張)，圖片 bytes 為其中第一張；
+    settings["thumbnail"] 有設定時另有 "thumbnail"：第一張圖的縮圖 (同一張圖只縮一次)；
+    instrument=True 時另有 "metrics" (見 instrumentation.METRIC_COLUMNS)。
+    開檔與建索引只發生一次，時間記在第一個案件上；共用同一張渲染圖的後續案件渲染時間為 0。
+    """
+    # 追蹤記憶體會拖慢所有 Python 配置，只在記錄效能數據時開啟，結束時釋放 (最後一個使用者結束才真正關閉)
+    if instrument:
+        start_memory_tracking()
+    metrics = [empty_metrics() for _ in target_fig_texts]
+    max_figures = settings.get("max_figures", 1)
+    thumbnail_px = settings.get("thumbnail")
+    # 這些選項只決定要找幾張、要不要縮圖，同一張圖的渲染結果與它們無關
+    key_settings = {k: v for k, v in settings.items() if k not in EXTRACT_OPTIONS}
+    thumbnails = {}
+
+    def info(i, cache_state, figures=None, thumbnail=None):
+        result = {"cache": cache_state}
+        if max_figures > 1:
+            result["figures"] = figures or []
+        if thumbnail_px:
+            result["thumbnail"] = thumbnail
+        if instrument:
+            metrics[i][PEAK_MB] = max(metrics[i][PEAK_MB], peak_memory_mb())
+            result["metrics"] = metrics[i]
+        return result
+
+    doc = None
+    try:
+        if instrument:
+            reset_peak_memory()
+        content_hash = content_hash or pdf_content_hash(pdf_stream)
+        index = cached_figure_index(content_hash, cache)
+        if index is None:
+            start = time.perf_counter()
+            doc = open_pdf(pdf_stream)
+            if metrics: metrics[0][OPEN_MS] = elapsed_ms(start)
+            start = time.perf_counter()
+            index = get_figure_index(pdf_stream, doc=doc, content_hash=content_hash, cache=cache)
+            if metrics:
+                metrics[0][INDEX_MS] = elapsed_ms(start)
+                metrics[0][PAGES_SCANNED] = index.page_count
+        results = []
+        rendered = {}
+        for i, text in enumerate(target_fig_texts):
+            if i and instrument:
+                reset_peak_memory()
+            located = locate_figures(index, text, max_figures)
+            render_keys = []
+            for page_index, label, _, _ in located:
+                if page_index is None:
+                    continue
+                # 裁切模式下同一頁的不同圖號會裁出不同範圍，標籤也要算進鍵裡
+                render_key = (page_index, label) if settings.get("mode") == "clip" else (page_index, None)
+                if render_key not in render_keys:
+                    render_keys.append(render_key)
+            if not render_keys:
+                results.append((None, located[0][3], info(i, "")))
+                continue
+            # 裁切模式依投影片上的格子大小決定解析度：多張圖並排時每張只佔圖框的一格
+            cells = len(render_keys) if settings.get("mode") == "clip" else 1
+            render_keys = [key + (cells,) for key in render_keys]
+
+            for render_key in render_keys:
+                if render_key in rendered:
+                    continue
+                page_index, label, cells = render_key
+                render_settings = dict(settings, box=figure_cell_box(settings["box"], cells)) if cells > 1 else settings
+                cell_key_settings = dict(key_settings, box=render_settings["box"]) if cells > 1 else key_settings
+                cache_key = cache.make_key(content_hash, page_index, dict(cell_key_settings, label=label) if label else cell_key_settings) if cache else None
+                img_data = cache.get(cache_key) if cache else None
+                if img_data is not None:
+                    cache_state = "命中"
+                else:
+                    if doc is None:
+                        start = time.perf_counter()
+                        doc = open_pdf(pdf_stream)
+                        metrics[i][OPEN_MS] = round(metrics[i][OPEN_MS] + elapsed_ms(start), 1)
+                    start = time.perf_counter()
+                    img_data = render_page(doc, page_index, render_settings, label)
+                    metrics[i][RENDER_MS] = round(metrics[i][RENDER_MS] + elapsed_ms(start), 1)
+                    metrics[i][RENDERED_BYTES] += len(img_data)
+                    if cache:
+                        cache.put(cache_key, img_data)
+                    cache_state = "未命中" if cache else ""
+                rendered[render_key] = (img_data, cache_state)
+
+            figures = [rendered[key][0] for key in render_keys]
+            states = {rendered[key][1] for key in render_keys}
+            cache_state = "未命中" if "未命中" in states else states.pop()
+            missing = [keyword for page_index, _, keyword, _ in located if page_index is None]
+            msg = f"成功 (找不到 {'、'.join(missing)})" if missing else "成功"
+            thumbnail = None
+            if thumbnail_px:
+                if render_keys[0] not in thumbnails:
+                    thumbnails[render_keys[0]] = make_thumbnail(figures[0], thumbnail_px)
+                thumbnail = thumbnails[render_keys[0]]
+            results.append((figures[0], msg, info(i, cache_state, figures, thumbnail)))
+        return results
+    except Exception as e:
+        return [(None, f"PDF 解析發生錯誤: {str(e)}", info(i, "")) for i in range(len(target_fig_texts))]
+    finally:
+        if doc is not None:
+            doc.close()
+        if instrument:
+            stop_memory_tracking()
+
+
+# --- 函數：搜尋 PDF 截圖 ---
+def extract_specific_figure_from_pdf(pdf_stream, target_fig_text, cache=None, settings=DEFAULT_RENDER_SETTINGS):
+    img_data, msg, _ = extract_figures_from_pdf(pdf_stream, [target_fig_text], cache=cache, settings=settings)[0]
+    return img_data, msg
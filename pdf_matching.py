@@ -0,0 +1,95 @@
+import re
+from bisect import bisect_left
+
+# 案號與 PDF 檔名至少要有這麼長才做部分比對，避免很短的字串到處誤中
+MIN_MATCH_LENGTH = 5
+
+
+# 案號的號碼本體：去掉開頭的國別 (US、CN、WO...) 與結尾的種類碼 (B2、A1、B...)
+NUMBER_CORE_PATTERN = re.compile(r'^[a-zA-Z]*(\d+?)(?:[a-zA-Z]\d?)?$')
+
+
+def normalize_pdf_key(filename):
+    return re.sub(r'[^a-zA-Z0-9]', '', filename.rsplit('.', 1)[0])
+
+
+def number_core(key):
+    """'US10000010B' -> '10000010'；不是「國別 + 數字 + 種類碼」的形式時回傳空字串"""
+    match = NUMBER_CORE_PATTERN.match(key)
+    return match.group(1) if match else ""
+
+
+class PdfMatchIndex:
+    """
+    案號 -> PDF 的比對索引，由正規化後的檔名建立一次：
+    - 完全一致：dict 查詢
+    - PDF 檔名是案號的前綴 / 後綴 (例如 US1234567 對 US1234567B2)：逐一查詢案號的前綴、後綴
+    - 案號是 PDF 檔名的前綴 / 後綴：在排序好的檔名 (與反轉檔名) 上二分搜尋
+    - 以上都沒有時，比對去掉國別與種類碼後的號碼 (例如 US10000010B 對 10000010.pdf)，回報為 "number"
+    有多個候選時依長度最接近案號者優先，同長度則依上傳順序，並把所有候選回報出來。
+    """
+
+    def __init__(self, pdf_keys):
+        self._order = {}
+        self._keys = {}
+        for pos, key in enumerate(pdf_keys):
+            lower = key.lower()
+            if lower not in self._keys:
+                self._keys[lower] = key
+                self._order[lower] = pos
+        self._cores = {}
+        for lower in self._keys:
+            core = number_core(lower)
+            if len(core) >= MIN_MATCH_LENGTH:
+                self._cores.setdefault(core, []).append(lower)
+        self._sorted = sorted(self._keys)
+        self._sorted_reversed = sorted(k[::-1] for k in self._keys)
+
+    @staticmethod
+    def _starting_with(sorted_keys, prefix):
+        start = bisect_left(sorted_keys, prefix)
+        found = []
+        for key in sorted_keys[start:]:
+            if not key.startswith(prefix):
+                break
+            if key != prefix:
+                found.append(key)
+        return found
+
+    def lookup(self, case_key):
+        """回傳 (PDF key 或 None, 比對方式 "exact" / "partial" / "number" / "", 所有候選 PDF key)"""
+        if not case_key or len(case_key) < MIN_MATCH_LENGTH:
+            return None, "", []
+        ck = case_key.lower()
+        if ck in self._keys:
+            return self._keys[ck], "exact", [self._keys[ck]]
+
+        candidates = set()
+        for i in range(MIN_MATCH_LENGTH, len(ck)):
+            if ck[:i] in self._keys: candidates.add(ck[:i])
+            if ck[-i:] in self._keys: candidates.add(ck[-i:])
+        candidates.update(self._starting_with(self._sorted, ck))
+        candidates.update(k[::-1] for k in self._starting_with(self._sorted_reversed, ck[::-1]))
+        if not candidates:
+            core_candidates = self._cores.get(number_core(ck), [])
+            if not core_candidates:
+                return None, "", []
+            ranked = sorted(core_candidates, key=lambda k: self._order[k])
+            return self._keys[ranked[0]], "number", [self._keys[k] for k in ranked]
+
+        ranked = sorted(candidates, key=lambda k: (abs(len(k) - len(ck)), self._order[k]))
+        return self._keys[ranked[0]], "partial", [self._keys[k] for k in ranked]
+
+
+def describe_match(kind, candidates):
+    """診斷報告「比對」欄位的文字"""
+    if kind == "exact":
+        return "完全一致"
+    if kind == "partial":
+        if len(candidates) > 1:
+            return f"⚠️ 多筆候選: {', '.join(candidates)} (採用 {candidates[0]})"
+        return "部分一致"
+    if kind == "number":
+        note = f"，多筆候選: {', '.join(candidates)} (採用 {candidates[0]})" if len(candidates) > 1 else ""
+        return f"⚠️ 僅號碼一致 (國別或種類碼不同{note})"
+    return ""
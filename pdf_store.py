@@ -0,0 +1,68 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import weakref
+
+# 複製上傳檔到暫存檔時每次讀取的大小
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+
+class PdfStore:
+    """
+    上傳的 PDF 先分段寫入暫存資料夾，之後一律以路徑交給 MuPDF 開啟 (按需讀取頁面)，
+    記憶體中只留檔名、路徑與內容雜湊。檔案以內容雜湊命名，重複上傳的同一份 PDF 只存一份。
+    同一個上傳檔 (file_id 或 檔名+大小 相同) 在 Streamlit 重跑時不會重新寫入。
+    """
+
+    def __init__(self, root=None):
+        self.root = root or tempfile.mkdtemp(prefix="ppt-maker-pdf-")
+        self._entries = {}
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.root, True)
+
+    @staticmethod
+    def upload_id(uploaded_file):
+        file_id = getattr(uploaded_file, "file_id", None)
+        if file_id:
+            return file_id
+        return (uploaded_file.name, getattr(uploaded_file, "size", None))
+
+    def add(self, uploaded_file, check=None):
+        """寫入暫存檔，回傳 (路徑, 內容雜湊)；check 在每寫入一段後呼叫 (拋出例外即中止，不留下暫存檔)"""
+        upload_id = self.upload_id(uploaded_file)
+        entry = self._entries.get(upload_id)
+        if entry and os.path.exists(entry[0]):
+            return entry
+
+        digest = hashlib.sha1()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            uploaded_file.seek(0)
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: uploaded_file.read(SPOOL_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    if check is not None:
+                        check()
+            fingerprint = digest.hexdigest()
+            path = os.path.join(self.root, f"{fingerprint}.pdf")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._entries[upload_id] = (path, fingerprint)
+        return path, fingerprint
+
+    def retain(self, uploaded_files):
+        """只保留目前仍在上傳清單中的檔案，其餘暫存檔刪除"""
+        keep = {self.upload_id(f) for f in uploaded_files}
+        for upload_id in list(self._entries):
+            if upload_id not in keep:
+                path, _ = self._entries.pop(upload_id)
+                if path not in {p for p, _ in self._entries.values()} and os.path.exists(path):
+                    os.remove(path)
+
+    def cleanup(self):
+        self._entries.clear()
+        self._finalizer()
@@ -0,0 +1,276 @@
+import json
+import os
+import time
+from concurrent.futures import as_completed
+from io import BytesIO
+
+from instrumentation import PARSE_MS, Stopwatch, elapsed_ms, empty_metrics
+from parallel import process_pool
+from pdf_figures import DEFAULT_RENDER_SETTINGS, extract_figures_from_pdf
+from pdf_matching import PdfMatchIndex, describe_match
+from word_parser import parse_docx
+
+
+def read_upload(f):
+    """檔案路徑或上傳檔物件 -> (檔名, bytes)"""
+    if isinstance(f, str):
+        with open(f, "rb") as fp:
+            return os.path.basename(f), fp.read()
+    data = f.getvalue() if hasattr(f, "getvalue") else f.read()
+    return f.name, data
+
+
+def error_status(source_file, reason):
+    """無法對應到案件的錯誤 (例如整份 Word 解析失敗) 在診斷報告中的一列"""
+    return {
+        "來源": source_file, "案號": "-", "公司": "", "日期": "",
+        "狀態": "❌ 解析失敗", "原因": reason, "缺漏": "", "快取": "", "比對": ""
+    }
+
+
+def _parse_docx_task(task):
+    name, data = task
+    start = time.perf_counter()
+    try:
+        return parse_docx(BytesIO(data), source_file=name), None, elapsed_ms(start)
+    except Exception as e:
+        return [], f"解析 Word 錯誤: {e}", elapsed_ms(start)
+
+
+# --- 函數：批次解析 Word (可分散到多個程序，單檔失敗不影響其他檔案) ---
+def parse_word_files_each(word_files, workers=1):
+    """回傳依上傳順序的 [(檔名, 案件列表, 錯誤訊息或 None, 解析時間 ms), ...]"""
+    slots = []
+    tasks = []
+    for f in word_files:
+        try:
+            slots.append(len(tasks))
+            tasks.append(read_upload(f))
+        except Exception as e:
+            slots[-1] = (getattr(f, "name", str(f)), [], f"讀取檔案失敗: {e}", 0.0)
+
+    if workers > 1 and len(tasks) > 1:
+        with process_pool(min(workers, len(tasks))) as pool:
+            futures = [pool.submit(_parse_docx_task, task) for task in tasks]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(([], f"解析程序異常結束: {e}", 0.0))
+    else:
+        results = [_parse_docx_task(task) for task in tasks]
+
+    return [
+        slot if isinstance(slot, tuple) else (tasks[slot][0],) + results[slot]
+        for slot in slots
+    ]
+
+
+def parse_word_files(word_files, workers=1, parse_timings=None):
+    """
+    回傳 (依上傳順序合併的案件列表, 失敗檔案的診斷報告列)
+    parse_timings 若傳入 dict，會填入 {檔名: 解析時間 ms}
+    """
+    all_cases = []
+    errors = []
+    for name, cases, error, ms in parse_word_files_each(word_files, workers):
+        if parse_timings is not None:
+            parse_timings[name] = ms
+        if error:
+            errors.append(error_status(name, error))
+        all_cases.extend(cases)
+    return all_cases, errors
+
+
+def _extract_pdf_task(task):
+    pdf_source, target_fig_texts, cache, settings, instrument, content_hash = task
+    return extract_figures_from_pdf(
+        pdf_source, target_fig_texts, cache=cache, settings=settings, instrument=instrument, content_hash=content_hash
+    )
+
+
+# --- 函數：批次擷取代表圖 (依 PDF 分組，可分散到多個程序) ---
+def extract_figures(jobs, pdf_file_map, workers=1, cache=None, settings=DEFAULT_RENDER_SETTINGS, instrument=False,
+                    pdf_fingerprints=None, progress=None):
+    """
+    jobs: [(pdf_key, 代表圖說明文字), ...]
+    pdf_file_map 的值可以是 PDF 內容 (bytes) 或暫存檔路徑；用路徑時子程序只收到路徑，自己開檔。
+    pdf_fingerprints: 已知的 {pdf_key: 內容雜湊}，可省去重新計算
+    progress: 每份 PDF 處理完就呼叫 progress([(jobs 中的位置, 結果), ...])；拋出例外即中止，尚未開始的 PDF 不再處理
+    回傳與 jobs 同順序的 [(圖片 bytes 或 None, 訊息, 附加資訊), ...]
+    同一份 PDF 的案件合併成一個工作，PDF 內容只傳給子程序一次。
+    """
+    groups = {}
+    for pos, (pdf_key, target_fig) in enumerate(jobs):
+        groups.setdefault(pdf_key, []).append((pos, target_fig))
+    pdf_fingerprints = pdf_fingerprints or {}
+    tasks = [
+        (pdf_file_map[pdf_key], [fig for _, fig in items], cache, settings, instrument, pdf_fingerprints.get(pdf_key))
+        for pdf_key, items in groups.items()
+    ]
+
+    results = [None] * len(jobs)
+    group_items = list(groups.values())
+
+    def collect(g, group_results):
+        done = list(zip((pos for pos, _ in group_items[g]), group_results))
+        for pos, result in done:
+            results[pos] = result
+        if progress is not None:
+            progress(done)
+
+    if workers > 1 and len(tasks) > 1:
+        pool = process_pool(min(workers, len(tasks)))
+        try:
+            futures = {pool.submit(_extract_pdf_task, task): g for g, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
+        except BaseException:
+            # 中止時不等還沒開始的 PDF；已在子程序中處理的會自行結束
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+    else:
+        for g, task in enumerate(tasks):
+            collect(g, _extract_pdf_task(task))
+    return results
+
+
+# --- 函數：依案號比對 PDF，回傳每個案件的 (PDF key 或 None, 比對方式, 候選) ---
+def match_cases(all_cases, pdf_keys):
+    match_index = PdfMatchIndex(pdf_keys)
+    return [match_index.lookup(case["raw_case_no"]) for case in all_cases]
+
+
+def figure_jobs(all_cases, matches):
+    return [(pk, case["rep_fig_text"]) for case, (pk, _, _) in zip(all_cases, matches) if pk]
+
+
+# --- 函數：把擷取結果寫回案件，產生診斷報告 ---
+def apply_figures(all_cases, matches, extracted, parse_timings=None):
+    """parse_timings 有傳入 (效能記錄開啟) 時，診斷報告每列加上 instrumentation.METRIC_COLUMNS 欄位"""
+    status_report_list = []
+    extracted = iter(extracted)
+    match_count = 0
+    for case, (pk, kind, candidates) in zip(all_cases, matches):
+        case_key = case["raw_case_no"]
+        target_fig = case["rep_fig_text"]
+        status = {
+            "來源": case["source_file"], "案號": case_key if case_key else "?",
+            "公司": case["sort_company"], "日期": case["sort_date"],
+            "狀態": "未處理", "原因": "", "缺漏": ", ".join(case["missing_fields"]), "快取": "",
+            "比對": describe_match(kind, candidates)
+        }
+
+        if parse_timings is not None:
+            status[PARSE_MS] = parse_timings.get(case["source_file"], 0.0)
+            status.update(empty_metrics())
+
+        if pk:
+            img_data, msg, info = next(extracted)
+            status["快取"] = info["cache"]
+            if parse_timings is not None and "metrics" in info:
+                status.update(info["metrics"])
+            if img_data:
+                case["image_data"] = img_data
+                case["figures"] = info.get("figures") or [img_data]
+                case["thumbnail"] = info.get("thumbnail")
+                status["狀態"] = "✅ 成功"; match_count += 1
+                if msg != "成功": status["原因"] = msg
+            else:
+                status["狀態"] = "⚠️ 缺圖"; status["原因"] = msg
+        else:
+            if not target_fig: status["狀態"] = "⚠️ 缺資訊"; status["原因"] = "Word無代表圖"
+            else: status["狀態"] = "❌ 無PDF"; status["原因"] = f"找不到PDF: {case_key}"
+        status_report_list.append(status)
+    return status_report_list, match_count
+
+
+# --- 函數：整合 Word 案件與 PDF 代表圖，產生診斷報告 ---
+def integrate_cases(all_cases, pdf_file_map, workers=1, cache=None, settings=DEFAULT_RENDER_SETTINGS,
+                    parse_timings=None, stage_timings=None):
+    """
+    parse_timings: parse_word_files 填好的 {檔名: ms}，傳入代表開啟效能記錄
+    stage_timings: 若傳入 dict，累加「比對」「擷取」兩個階段的時間 (ms)
+    """
+    instrument = parse_timings is not None
+    stage_timings = {} if stage_timings is None else stage_timings
+    with Stopwatch(stage_timings, "比對"):
+        matches = match_cases(all_cases, pdf_file_map)
+    with Stopwatch(stage_timings, "擷取"):
+        extracted = extract_figures(figure_jobs(all_cases, matches), pdf_file_map, workers, cache, settings, instrument)
+    return apply_figures(all_cases, matches, extracted, parse_timings)
+
+
+# --- 函數：依申請人 -> 日期排序 (案件與診斷報告各自排序，原地修改) ---
+def sort_results(all_cases, status_report_list):
+    all_cases.sort(key=lambda x: (x["sort_company"].upper(), x["sort_date"]))
+    status_report_list.sort(key=lambda x: (x["公司"].upper(), x["日期"]))
+
+
+# --- 增量整合：記住上一次的解析與擷取結果，只重做有變動的部分 ---
+class IncrementalIntegrator:
+    """
+    - Word：以檔案內容雜湊記住解析結果，只解析新加入或內容改變的檔案
+    - 代表圖：擷取結果只取決於 (PDF 內容雜湊, 代表圖文字, 渲染設定)，以此為鍵記住；
+      新增 / 移除 PDF 後重新比對所有案件 (比對本身很便宜)，只有比對結果落到新鍵的案件才重新擷取
+    每次整合後只保留這次用到的結果，記憶體不會隨著來回增減檔案累積。
+    """
+
+    def __init__(self):
+        self.docx_results = {}
+        self.figure_results = {}
+
+    def parse(self, word_files, fingerprints, workers=1, parse_timings=None):
+        """回傳 (案件列表, 失敗檔案的診斷報告列, 這次實際解析的檔案數)"""
+        pending = [(fp, f) for fp, f in zip(fingerprints, word_files) if fp not in self.docx_results]
+        parsed = parse_word_files_each([f for _, f in pending], workers)
+        for (fp, _), result in zip(pending, parsed):
+            self.docx_results[fp] = result
+
+        all_cases = []
+        errors = []
+        for fp in fingerprints:
+            name, cases, error, ms = self.docx_results[fp]
+            if parse_timings is not None:
+                parse_timings[name] = ms
+            if error:
+                errors.append(error_status(name, error))
+            # 交出副本：後續寫入 image_data 不會污染記住的解析結果
+            all_cases.extend(dict(case) for case in cases)
+        self.docx_results = {fp: self.docx_results[fp] for fp in fingerprints}
+        return all_cases, errors, len(pending)
+
+    def extract(self, jobs, pdf_file_map, pdf_fingerprints, workers=1, cache=None,
+                settings=DEFAULT_RENDER_SETTINGS, instrument=False, progress=None):
+        """jobs、progress 同 extract_figures (沿用的結果最先回報)；回傳 (與 jobs 同順序的擷取結果, 這次實際擷取的案件數)"""
+        settings_key = json.dumps(settings, sort_keys=True)
+        keys = [(pdf_fingerprints[pk], fig, settings_key) for pk, fig in jobs]
+        pending = [i for i, key in enumerate(keys) if key not in self.figure_results]
+
+        results = [None] * len(jobs)
+        pending_set = set(pending)
+        for i, key in enumerate(keys):
+            if i not in pending_set:
+                img_data, msg, info = self.figure_results[key]
+                info = dict(info, cache="沿用")
+                if "metrics" in info:
+                    info["metrics"] = empty_metrics()
+                results[i] = (img_data, msg, info)
+        if progress is not None and len(pending) < len(jobs):
+            progress([(i, result) for i, result in enumerate(results) if i not in pending_set])
+
+        def remember(done):
+            # 結果一完成就記住：中途取消後再整合，已擷取的案件不必重做
+            done = [(pending[i], result) for i, result in done]
+            for pos, result in done:
+                self.figure_results[keys[pos]] = result
+                results[pos] = result
+            if progress is not None:
+                progress(done)
+
+        extract_figures([jobs[i] for i in pending], pdf_file_map, workers, cache, settings, instrument,
+                        pdf_fingerprints, progress=remember)
+        self.figure_results = {key: self.figure_results[key] for key in keys}
+        return results, len(pending)
@@ -0,0 +1,426 @@
+from io import BytesIO
+import hashlib
+import re
+import zipfile
+
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls
+from pptx.parts.image import Image, ImagePart
+from pptx.parts.slide import SlidePart
+from pptx.util import Inches
+
+from instrumentation import Stopwatch
+from parallel import process_pool
+from pdf_figures import FIGURE_BOX_INCHES, FIGURE_GAP_INCHES
+
+
+# 關鍵修正：
+# 1. \(Claim\s*\d+\) -> 抓取夾在中間的 (Claim 1)
+# 2. ^\s*(Claim|獨立項)\s*\d+ -> 抓取行首的 Claim 1
+# 3. ^\s*\d+\.\s -> 抓取行首的 1. (注意後面的空格，避免抓到 1.5mm)
+CLAIM_HEADER_PATTERN = re.compile(r'(\(Claim\s*\d+\)|^\s*(Claim|獨立項)\s*\d+|^\s*\d+\.\s)', re.IGNORECASE)
+
+
+# --- 輔助函數：分割 Claim (嚴格修正版) ---
+def split_claims_text(full_text):
+    """
+    分割依據：
+    1. "(Claim 數字)" -> 這是您的 Word 中標題的特徵 (例如 '• ... (Claim 1)')
+    2. 行首 "Claim 數字"
+    3. 行首 "獨立項 數字"
+    4. 行首 "數字. " (排除內文中可能出現的數字)
+    """
+    if not full_text: return []
+    
+    lines = full_text.split('\n')
+    claims = []
+    current_chunk = []
+    
+    for line in lines:
+        # 如果這一行符合標題特徵
+        if CLAIM_HEADER_PATTERN.search(line):
+            if current_chunk:
+                claims.append(current_chunk)
+            current_chunk = [line]
+        else:
+            current_chunk.append(line)
+            
+    if current_chunk:
+        claims.append(current_chunk)
+    
+    # 過濾空資料
+    valid_claims = []
+    for chunk in claims:
+        chunk_str = "".join(chunk).strip()
+        if len(chunk_str) > 2:
+            valid_claims.append(chunk)
+            
+    return valid_claims
+
+
+# --- 輔助函數：每個案件的 Claim 分頁內容 (分不出組別時整段當一頁) ---
+def claim_groups_for_case(data):
+    claims_groups = split_claims_text(data['claim_text'])
+    if not claims_groups and data['claim_text'].strip():
+        claims_groups = [data['claim_text'].split('\n')]
+    return claims_groups
+
+
+# --- PPT 生成邏輯 ---
+# 版面 (英吋)：(left, top, width, height)；字型大小、粗體、顏色都寫在版面的預留位置上，每頁只填文字
+HEADER_BOX = (0.5, 0.5, 5.0, 2.0)
+FIGURE_BOX = (5.5, 0.5) + FIGURE_BOX_INCHES
+BODY_BOX = (0.5, 4.8, 12.3, 1.5)
+KEY_POINT_BOX = (0.5, 6.5, 12.3, 0.8)
+CLAIM_TITLE_BOX = (0.5, 2.5, 12.3, 0.6)
+CLAIM_BOX = (0.5, 3.1, 12.3, 3.9)
+KEY_POINT_COLOR = "FFC000"
+CLAIM_TITLE_COLOR = "0070C0"
+
+# 預留位置編號 (避開母片頁尾 / 頁碼用的 10~12)
+HEADER_IDX, FIGURE_IDX, BODY_IDX, KEY_POINT_IDX, CLAIM_IDX = 20, 21, 22, 23, 24
+
+# 多張代表圖並排時的間距
+FIGURE_GAP = Inches(FIGURE_GAP_INCHES)
+
+
+def case_figures(data):
+    """案件的代表圖列表；單張模式 (或舊資料) 只有 image_data"""
+    return data.get('figures') or ([data['image_data']] if data['image_data'] else [])
+
+
+def _xfrm(box):
+    left, top, width, height = (int(Inches(v)) for v in box)
+    return f'<a:xfrm><a:off x="{left}" y="{top}"/><a:ext cx="{width}" cy="{height}"/></a:xfrm>'
+
+
+def _level_style(level, size, bold=False, align="l", space_after=0, margin=0):
+    return (
+        f'<a:lvl{level}pPr marL="{int(margin)}" indent="0" algn="{align}">'
+        f'<a:lnSpc><a:spcPct val="100000"/></a:lnSpc><a:spcBef><a:spcPts val="0"/></a:spcBef>'
+        f'<a:spcAft><a:spcPts val="{space_after * 100}"/></a:spcAft><a:buNone/>'
+        f'<a:defRPr sz="{size * 100}" b="{int(bold)}"/></a:lvl{level}pPr>'
+    )
+
+
+def _placeholder(shape_id, name, idx, box, levels, anchor="t"):
+    return parse_xml(
+        f'<p:sp {nsdecls("p", "a")}><p:nvSpPr><p:cNvPr id="{shape_id}" name="{name}"/>'
+        f'<p:cNvSpPr><a:spLocks noGrp="1"/></p:cNvSpPr><p:nvPr><p:ph type="body" idx="{idx}"/></p:nvPr></p:nvSpPr>'
+        f'<p:spPr>{_xfrm(box)}</p:spPr>'
+        f'<p:txBody><a:bodyPr wrap="square" anchor="{anchor}"><a:noAutofit/></a:bodyPr>'
+        f'<a:lstStyle>{"".join(levels)}</a:lstStyle><a:p><a:endParaRPr lang="zh-TW"/></a:p></p:txBody></p:sp>'
+    )
+
+
+def _static_shape(shape_id, name, box, fill=None, text="", size=0, color=None):
+    fill_xml = f'<a:solidFill><a:srgbClr val="{fill}"/></a:solidFill><a:ln><a:solidFill><a:srgbClr val="{fill}"/></a:solidFill></a:ln>' if fill else '<a:noFill/>'
+    color_xml = f'<a:solidFill><a:srgbClr val="{color}"/></a:solidFill>' if color else ''
+    run = f'<a:r><a:rPr lang="zh-TW" sz="{size * 100}" b="1">{color_xml}</a:rPr><a:t>{text}</a:t></a:r>' if text else ''
+    return parse_xml(
+        f'<p:sp {nsdecls("p", "a")}><p:nvSpPr><p:cNvPr id="{shape_id}" name="{name}"/><p:cNvSpPr/><p:nvPr userDrawn="1"/></p:nvSpPr>'
+        f'<p:spPr>{_xfrm(box)}<a:prstGeom prst="rect"><a:avLst/></a:prstGeom>{fill_xml}</p:spPr>'
+        f'<p:txBody><a:bodyPr wrap="square"/><a:lstStyle/><a:p>{run}</a:p></p:txBody></p:sp>'
+    )
+
+
+def _reset_layout(layout, name, shapes):
+    """清掉版面原本的預留位置，換成這裡定義的圖形"""
+    layout._element.cSld.set("name", name)
+    sp_tree = layout.shapes._spTree
+    for shape in list(sp_tree.iter_shape_elms()):
+        sp_tree.remove(shape)
+    for shape in shapes:
+        sp_tree.append(shape)
+
+
+def build_layouts(prs):
+    """
+    回傳 (案件頁版面, Claim 頁版面)，沿用預設範本中沒用到的「空白」與「僅標題」版面改寫。
+    案件頁：左上案號、右上代表圖 (沒有圖時放說明文字)、中下解決問題 / 發明精神、底部橘色一句重點；
+    Claim 頁：左上案號、【獨立項 Claim】標題、依層級縮排的 Claim 內容。
+    """
+    header = _level_style(1, 20, bold=True)
+    case_layout = prs.slide_layouts[6]
+    _reset_layout(case_layout, "案件", [
+        _static_shape(2, "重點底色", KEY_POINT_BOX, fill=KEY_POINT_COLOR),
+        _placeholder(3, "案號", HEADER_IDX, HEADER_BOX, [header]),
+        _placeholder(4, "代表圖", FIGURE_IDX, FIGURE_BOX, [_level_style(1, 16)]),
+        _placeholder(5, "解決問題與發明精神", BODY_IDX, BODY_BOX, [_level_style(1, 18, space_after=12)]),
+        _placeholder(6, "一句重點", KEY_POINT_IDX, KEY_POINT_BOX, [_level_style(1, 20, bold=True, align="ctr")], anchor="ctr"),
+    ])
+    claim_layout = prs.slide_layouts[5]
+    _reset_layout(claim_layout, "Claim", [
+        _placeholder(2, "案號", HEADER_IDX, HEADER_BOX, [header]),
+        _static_shape(3, "Claim 標題", CLAIM_TITLE_BOX, text="【獨立項 Claim】", size=24, color=CLAIM_TITLE_COLOR),
+        _placeholder(4, "Claim", CLAIM_IDX, CLAIM_BOX, [
+            _level_style(level, 14, space_after=4, margin=Inches(0.5) * (level - 1)) for level in (1, 2, 3)
+        ]),
+    ])
+    return case_layout, claim_layout
+
+
+def _set_lines(placeholder, lines):
+    """每行一個段落；沒有內容時移除預留位置 (空的預留位置在 PowerPoint 裡會顯示「按一下以新增文字」)"""
+    lines = [line.strip() for line in lines if line.strip()]
+    if lines:
+        placeholder.text_frame.text = "\n".join(lines)
+    else:
+        _remove(placeholder)
+
+
+def _set_paragraphs(placeholder, paragraphs):
+    """每個字串一個段落，字串內的換行變成段落內的換行 (不另起段落、不套用段落間距)；沒有內容時移除預留位置"""
+    paragraphs = [text.strip() for text in paragraphs if text.strip()]
+    if not paragraphs:
+        _remove(placeholder)
+        return
+    tf = placeholder.text_frame
+    for n, text in enumerate(paragraphs):
+        p = tf.paragraphs[0] if n == 0 else tf.add_paragraph()
+        p.text = text
+
+
+def _add_slide(prs, layout):
+    """
+    同 prs.slides.add_slide (用到 python-pptx 的內部 API，版本固定在 requirements.txt)。python-pptx 新增關聯前會先逐一比對簡報既有的所有關聯 (頁數多時是 O(n²))，
+    新投影片不可能已有關聯，直接新增。
+    """
+    prs_part = prs.part
+    slide_part = SlidePart.new(prs_part._next_slide_partname, prs_part.package, layout.part)
+    rId = prs_part.rels._add_relationship(RT.SLIDE, slide_part)
+    slide = slide_part.slide
+    slide.shapes.clone_layout_placeholders(layout)
+    prs.slides._sldIdLst.add_sldId(rId)
+    return slide
+
+
+def _remove(shape):
+    shape._element.getparent().remove(shape._element)
+
+
+class ImageParts:
+    """
+    每份簡報一個：以內容雜湊記住已放進簡報的圖片。
+    python-pptx 的 add_picture 為了避免重複，每張圖都把簡報裡所有圖片重新算一次 SHA1 比對 (案件越多越慢)；
+    這裡每張圖只算一次雜湊，相同內容的圖片 (同一張代表圖被多個案件使用) 共用同一份圖片資料。
+    直接建立 ImagePart 與圖片圖形用到 python-pptx 的內部 API，版本固定在 requirements.txt。
+    """
+
+    def __init__(self, prs):
+        self.package = prs.part.package
+        self.parts = {}
+        # 圖片檔名自己編號：python-pptx 每新增一張圖都會走訪整份簡報找下一個可用編號
+        self.first_idx = 1 + sum(1 for part in self.package.iter_parts() if part.partname.startswith("/ppt/media/image"))
+
+    def add_picture(self, slide, img_data, left, top, max_width, height, center=False):
+        """等比縮放到高度 height (寬度超過 max_width 時改以寬度為準)；center=True 時在 max_width 範圍內水平置中"""
+        sha1 = hashlib.sha1(img_data).hexdigest()
+        if sha1 not in self.parts:
+            image = Image.from_blob(img_data)
+            (px_w, px_h), (dpi_x, dpi_y) = image.size, image.dpi
+            partname = PackURI(f"/ppt/media/image{self.first_idx + len(self.parts)}.{image.ext}")
+            image_part = ImagePart(partname, image.content_type, self.package, image.blob, image.filename)
+            self.parts[sha1] = (image_part, (px_w / dpi_x) / (px_h / dpi_y))
+        image_part, aspect = self.parts[sha1]
+        width = int(height * aspect)
+        if width > max_width:
+            width, height = int(max_width), int(max_width / aspect)
+        if center:
+            left += (max_width - width) // 2
+        rId = slide.part.relate_to(image_part, RT.IMAGE)
+        slide.shapes._add_pic_from_image_part(image_part, rId, left, top, width, height)
+
+
+def _add_figures(slide, images, figures):
+    """右上圖框放代表圖；多張時圖框均分成並排的格子，圖片在格子中置中"""
+    left, top, box_width, box_height = (Inches(v) for v in FIGURE_BOX)
+    cell_width = int((box_width - FIGURE_GAP * (len(figures) - 1)) / len(figures))
+    for n, img_data in enumerate(figures):
+        images.add_picture(slide, img_data, left + n * (cell_width + FIGURE_GAP), top, cell_width, box_height, center=len(figures) > 1)
+
+
+def _claim_level(line, clean_line):
+    """回傳 (層級, 是否粗體)"""
+    # === 關鍵縮排對應 (針對您的截圖) ===
+    # Level 0 (標題): 包含 (Claim X) 或黑點開頭
+    if "(Claim" in line or "獨立項" in line or clean_line.startswith(('•', '●')):
+        return 0, True
+    # Level 1: 空心圓 o, ○
+    if clean_line.startswith(('o ', '○', 'O ')):
+        return 1, False
+    # Level 2: 實心方塊 ▪, ■
+    if clean_line.startswith(('▪', '■')):
+        return 2, False
+    # Level 1: 減號 -, 數字 1.
+    if clean_line.startswith(('- ', '1.', '2.')):
+        return 1, False
+    return 0, False
+
+
+def generate_ppt(slides_data, need_claim_slide, claim_groups=None, progress=None):
+    """
+    claim_groups 可傳入事先算好的 [claim_groups_for_case(case), ...]，省去重新分割
+    progress: 每完成一個案件呼叫 progress(1)；拋出例外即中止
+    """
+    prs = Presentation()
+    prs.slide_width = Inches(13.333)
+    prs.slide_height = Inches(7.5)
+    case_layout, claim_layout = build_layouts(prs)
+    images = ImageParts(prs)
+
+    for case_no, data in enumerate(slides_data):
+        # === 第一頁：原本的內容 ===
+        slide = _add_slide(prs, case_layout)
+        placeholders = slide.placeholders
+        header_lines = data['case_info'].split('\n')
+        _set_lines(placeholders[HEADER_IDX], header_lines)
+
+        figures = case_figures(data)
+        if figures:
+            _remove(placeholders[FIGURE_IDX])
+            _add_figures(slide, images, figures)
+        else:
+            content = data['rep_fig_text'] if data['rep_fig_text'].strip() else "無代表圖資訊"
+            _set_lines(placeholders[FIGURE_IDX], content.split('\n'))
+
+        _set_paragraphs(placeholders[BODY_IDX], [f"• 解決問題：{data['problem']}", f"• 發明精神：{data['spirit']}"])
+        _set_paragraphs(placeholders[KEY_POINT_IDX], [data['key_point']])
+
+        # === Claim 分頁邏輯 (如果勾選) ===
+        if need_claim_slide:
+            claims_groups = claim_groups[case_no] if claim_groups is not None else claim_groups_for_case(data)
+
+            for claim_lines in claims_groups:
+                slide_c = _add_slide(prs, claim_layout)
+                _set_lines(slide_c.placeholders[HEADER_IDX], header_lines)
+
+                claim_placeholder = slide_c.placeholders[CLAIM_IDX]
+                tf = claim_placeholder.text_frame
+                first = True
+                for line in claim_lines:
+                    clean_line = line.strip()
+                    if clean_line:
+                        p = tf.paragraphs[0] if first else tf.add_paragraph()
+                        first = False
+                        p.text = clean_line
+                        p.level, bold = _claim_level(line, clean_line)
+                        if bold: p.font.bold = True
+                if first:
+                    _remove(claim_placeholder)
+
+        if progress is not None:
+            progress(1)
+
+    return prs
+
+
+
+def build_deck_bytes(slides_data, need_claim_slide, claim_groups=None, timings=None, progress=None):
+    """timings 若傳入 dict，累加 "generate_ppt" 與 "prs.save" 的時間 (ms)；progress 同 generate_ppt"""
+    timings = {} if timings is None else timings
+    with Stopwatch(timings, "generate_ppt"):
+        prs = generate_ppt(slides_data, need_claim_slide, claim_groups, progress)
+    with Stopwatch(timings, "prs.save"):
+        binary_output = BytesIO()
+        prs.save(binary_output)
+    return binary_output.getvalue()
+
+
+# --- 分檔輸出：依申請人或頁數 / 大小上限把案件切成多份簡報，平行產生後打包成 zip ---
+# 每頁除圖片外的估計大小 (文字、版面 XML)
+SLIDE_OVERHEAD_BYTES = 4 * 1024
+
+
+def _slide_count(data, groups, need_claim_slide):
+    return 1 + (len(groups) if need_claim_slide else 0)
+
+
+def _estimated_bytes(data, groups, need_claim_slide):
+    return sum(len(img_data) for img_data in case_figures(data)) + SLIDE_OVERHEAD_BYTES * _slide_count(data, groups, need_claim_slide)
+
+
+def _safe_filename(text, limit=40):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', text).strip('_')[:limit] or "cases"
+
+
+def shard_cases(slides_data, need_claim_slide, claim_groups, by_company=False, max_slides=None, max_bytes=None):
+    """
+    回傳 [(檔名, [案件索引, ...]), ...]，保持原本的案件順序。
+    by_company=True 時申請人 (sort_company) 不同就換檔；max_slides / max_bytes 超過上限也換檔
+    (單一案件本身就超過上限時自成一檔)。
+    """
+    shards = []
+    current, slides, size, company = [], 0, 0, None
+    for i, data in enumerate(slides_data):
+        groups = claim_groups[i]
+        case_slides = _slide_count(data, groups, need_claim_slide)
+        case_bytes = _estimated_bytes(data, groups, need_claim_slide)
+        split = current and (
+            (by_company and data['sort_company'] != company)
+            or (max_slides and slides + case_slides > max_slides)
+            or (max_bytes and size + case_bytes > max_bytes)
+        )
+        if split:
+            shards.append(current)
+            current, slides, size = [], 0, 0
+        current.append(i); slides += case_slides; size += case_bytes; company = data['sort_company']
+    if current:
+        shards.append(current)
+
+    named = []
+    for n, indices in enumerate(shards, start=1):
+        label = slides_data[indices[0]]['sort_company'] if by_company else f"cases_{indices[0] + 1}-{indices[-1] + 1}"
+        named.append((f"{n:02d}_{_safe_filename(label)}.pptx", indices))
+    return named
+
+
+def _build_shard_task(task):
+    shard_slides, need_claim_slide, shard_groups = task
+    timings = {}
+    deck_bytes = build_deck_bytes(shard_slides, need_claim_slide, shard_groups, timings)
+    return deck_bytes, timings
+
+
+def build_deck_zip(slides_data, need_claim_slide, claim_groups, shards, workers=1, timings=None, progress=None, output=None):
+    """
+    每份分檔在獨立程序中產生 (記憶體只需容納單一分檔)，依分檔順序寫入 zip。
+    output 可以是檔案路徑或可寫入的檔案物件，zip 直接寫到那裡並回傳 None；未指定時回傳 zip 的 bytes
+    timings 若傳入 dict，累加各分檔的 "generate_ppt" 與 "prs.save" 時間 (ms，各程序時間相加)
+    progress: 每寫入一份分檔呼叫 progress(該分檔案件數)；拋出例外即中止
+    """
+    timings = {} if timings is None else timings
+
+    def add(shard_timings):
+        for key, ms in shard_timings.items():
+            timings[key] = round(timings.get(key, 0) + ms, 1)
+
+    tasks = (
+        ([slides_data[i] for i in indices], need_claim_slide, [claim_groups[i] for i in indices])
+        for _, indices in shards
+    )
+    buffer = BytesIO() if output is None else None
+    # pptx 本身已是壓縮檔，zip 內不再壓縮
+    with zipfile.ZipFile(buffer if output is None else output, "w", compression=zipfile.ZIP_STORED) as zf:
+        if workers > 1 and len(shards) > 1:
+            pool = process_pool(min(workers, len(shards)))
+            try:
+                futures = [pool.submit(_build_shard_task, task) for task in tasks]
+                for (name, indices), future in zip(shards, futures):
+                    deck_bytes, shard_timings = future.result()
+                    zf.writestr(name, deck_bytes); add(shard_timings)
+                    if progress is not None: progress(len(indices))
+            except BaseException:
+                # 中止時不等還沒開始的分檔；已在子程序中產生的會自行結束
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            pool.shutdown()
+        else:
+            for (name, indices), task in zip(shards, tasks):
+                deck_bytes, shard_timings = _build_shard_task(task)
+                zf.writestr(name, deck_bytes); add(shard_timings)
+                if progress is not None: progress(len(indices))
+    return buffer.getvalue() if output is None else None
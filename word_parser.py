@@ -0,0 +1,201 @@
+import os
+import re
+import zipfile
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W = "{%s}" % W_NS
+_BODY = _W + "body"
+_P = _W + "p"
+_TBL = _W + "tbl"
+_TR = _W + "tr"
+_TC = _W + "tc"
+_R = _W + "r"
+_HYPERLINK = _W + "hyperlink"
+_T = _W + "t"
+_BR = _W + "br"
+_BR_TYPE = _W + "type"
+# 套件根關聯 (_rels/.rels)：officeDocument 關聯指向本文所在的 part (通常是 word/document.xml，Word Online 等可能存成 document2.xml)
+_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_OFFICE_DOCUMENT_TYPES = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument",
+    "http://purl.oclc.org/ooxml/officeDocument/relationships/officeDocument",
+)
+# run 內會輸出文字的元素 (與 python-docx Run.text 相同；w:br 只有換行才算，分頁 / 分欄不輸出)
+_RUN_TEXT = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+
+# --- 函數：提取專利號 ---
+def extract_patent_number_from_text(text):
+    clean_text = text.replace("：", ":").replace(" ", "")
+    match = re.search(r'([a-zA-Z]{2,4}\d+[a-zA-Z]?)', clean_text)
+    if match: return match.group(1)
+    return ""
+
+# --- 函數：提取日期 (排序用) ---
+def extract_date_for_sort(text):
+    match = re.search(r'(\d{4})[./-](\d{1,2})[./-](\d{1,2})', text)
+    if match: return f"{match.group(1)}{match.group(2).zfill(2)}{match.group(3).zfill(2)}"
+    return "99999999"
+
+# --- 函數：提取公司 (排序用) ---
+def extract_company_for_sort(text):
+    lines = text.split('\n')
+    for line in lines:
+        if "公司" in line or "申請人" in line:
+            if "案號" in line and "日期" in line: continue
+            return line.replace("公司", "").replace("申請人", "").replace("：", "").replace(":", "").strip()
+    return "ZZZ"
+
+
+# --- 輔助函數：串流讀取 document.xml，依序產生段落文字 ---
+def _paragraph_text(p):
+    parts = []
+    for child in p:
+        if child.tag == _R:
+            runs = (child,)
+        elif child.tag == _HYPERLINK:
+            runs = child.iterchildren(_R)
+        else:
+            continue
+        for run in runs:
+            for elm in run:
+                if elm.tag == _T:
+                    parts.append(elm.text or "")
+                elif elm.tag == _BR:
+                    if elm.get(_BR_TYPE, "textWrapping") == "textWrapping": parts.append("\n")
+                elif elm.tag in _RUN_TEXT:
+                    parts.append(_RUN_TEXT[elm.tag])
+    return "".join(parts)
+
+
+def _main_document_part(zf):
+    """依 _rels/.rels 的 officeDocument 關聯找出本文 part 的路徑 (同 python-docx)；沒有關聯檔時用預設路徑"""
+    try:
+        rels = etree.fromstring(zf.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for rel in rels.iter(_RELATIONSHIP):
+        if rel.get("Type") in _OFFICE_DOCUMENT_TYPES and rel.get("TargetMode") != "External":
+            return rel.get("Target").lstrip("/")
+    return "word/document.xml"
+
+
+def iter_docx_lines(docx_file):
+    """
+    逐一產生 Word 內文的非空白行 (已 strip)：本文段落，以及表格每個儲存格內的段落。
+    直接用 lxml iterparse 讀 document.xml，處理完一個本文區塊就釋放，記憶體不隨文件長度成長；
+    合併儲存格在 XML 裡只有一個 <w:tc>，不會像 python-docx 的 row.cells 重複輸出。
+    """
+    with zipfile.ZipFile(docx_file) as zf:
+        with zf.open(_main_document_part(zf)) as xml:
+            for _, elm in etree.iterparse(xml, events=("end",), tag=(_P, _TBL)):
+                parent = elm.getparent()
+                if parent is None or parent.tag != _BODY:
+                    continue
+                if elm.tag == _P:
+                    text = _paragraph_text(elm).strip()
+                    if text: yield text
+                else:
+                    for tr in elm.iterchildren(_TR):
+                        for tc in tr.iterchildren(_TC):
+                            for p in tc.iterchildren(_P):
+                                text = _paragraph_text(p).strip()
+                                if text: yield text
+                elm.clear()
+                while elm.getprevious() is not None:
+                    del parent[0]
+
+
+# --- 欄位判斷：一次 regex 掃描找出所有標題關鍵字，再依原本的優先順序決定欄位 ---
+FIELD_PATTERN = re.compile(r'(案號|索號)|(解決問題)|(發明精神)|(重點)|(代表圖)|(獨立項)|(claim)', re.IGNORECASE)
+# 對應 FIELD_PATTERN 的群組順序 (群組號碼越小優先權越高)
+FIELD_BY_GROUP = (None, "case_info_block", "problem", "spirit", "key_point", "rep_fig", "claim", "claim")
+FIELD_PREFIX = {
+    "problem": re.compile(r'^[0-9.．]*\s*解決問題[:：]?\s*'),
+    "spirit": re.compile(r'^[0-9.．]*\s*發明精神[:：]?\s*'),
+    "key_point": re.compile(r'^[0-9.．]*\s*(一句)?重點[:：]?\s*'),
+    "rep_fig": re.compile(r'^[0-9.．]*\s*代表圖[:：]?\s*'),
+    "claim": re.compile(r'^[0-9.．]*\s*(獨立項)?(claim)?[:：]?\s*', re.IGNORECASE),
+}
+FIELD_KEY = {"problem": "problem", "spirit": "spirit", "key_point": "key_point", "rep_fig": "rep_fig_text", "claim": "claim_text"}
+
+
+def detect_field(text):
+    best = None
+    for match in FIELD_PATTERN.finditer(text):
+        group = match.lastindex
+        # "claim" 只有同一行也出現 6 (第 6 點) 時才算 claim 標題
+        if group == 7 and "6" not in text:
+            continue
+        if best is None or group < best:
+            best = group
+            if best == 1: break
+    return FIELD_BY_GROUP[best] if best else None
+
+
+def new_case(source_file):
+    return {
+        "case_info": "", "problem": "", "spirit": "", "key_point": "", "rep_fig_text": "", "claim_text": "",
+        "image_data": None, "figures": [], "thumbnail": None, "image_name": "Word匯入", "raw_case_no": "",
+        "sort_date": "99999999", "sort_company": "ZZZ",
+        "source_file": source_file, "missing_fields": []
+    }
+
+
+# --- 函數：解析 Word 檔案 ---
+def parse_docx(docx_file, source_file=None):
+    """
+    docx_file 可以是檔案路徑或檔案物件 (例如 Streamlit 的 UploadedFile)。
+    解析失敗時直接丟出例外，由呼叫端決定如何回報。
+    """
+    if source_file is None:
+        source_file = os.path.basename(docx_file) if isinstance(docx_file, str) else docx_file.name
+    cases = []
+    current_case = new_case(source_file)
+    current_field = None
+    company_found = False
+
+    for text in iter_docx_lines(docx_file):
+        field = detect_field(text)
+        if field == "case_info_block":
+            if current_case["case_info"] and current_field != "case_info_block":
+                if not current_case["problem"]: current_case["missing_fields"].append("解決問題")
+                cases.append(current_case)
+                current_case = new_case(source_file)
+            current_field = "case_info_block"
+            current_case["case_info"] = text
+            extracted_no = extract_patent_number_from_text(text)
+            if extracted_no: current_case["raw_case_no"] = extracted_no
+            current_case["sort_date"] = extract_date_for_sort(text)
+            current_case["sort_company"] = extract_company_for_sort(text)
+            company_found = current_case["sort_company"] != "ZZZ"
+            continue
+
+        if field:
+            current_field = field
+            content = FIELD_PREFIX[field].sub('', text, count=1)
+            if field in ("rep_fig", "claim"): content = content.strip()
+            current_case[FIELD_KEY[field]] = content
+            continue
+
+        if current_field == "case_info_block":
+            current_case["case_info"] += "\n" + text
+            if current_case["sort_date"] == "99999999": current_case["sort_date"] = extract_date_for_sort(text)
+            # 公司取案號區塊中第一個符合的行；之前的行都沒有時才需要看新的這一行
+            if not company_found:
+                extracted_comp = extract_company_for_sort(text)
+                if extracted_comp != "ZZZ":
+                    current_case["sort_company"] = extracted_comp
+                    company_found = True
+            if not current_case["raw_case_no"]:
+                extracted_no = extract_patent_number_from_text(text)
+                if extracted_no: current_case["raw_case_no"] = extracted_no
+        elif current_field in FIELD_KEY:
+            current_case[FIELD_KEY[current_field]] += "\n" + text
+
+    if current_case["case_info"]:
+        if not current_case["problem"]: current_case["missing_fields"].append("解決問題")
+        cases.append(current_case)
+    return cases